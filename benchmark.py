@@ -0,0 +1,390 @@
+"""Offline benchmarks for the retrieval and generation pipeline.
+
+Drives KnowledgeBase, MemorySystem and ClaudeClient entry points against
+local stand-ins for OpenAI, Pinecone and Anthropic with injected latency,
+and writes latency percentiles, upstream calls per operation and
+allocation sizes to a JSON file.
+
+    python -m src.core.benchmark --corpus-size 5000 --iterations 100
+    python -m src.core.benchmark --compare data/benchmarks/<previous>.json
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import types
+from collections import Counter
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .knowledge_base import KnowledgeBase
+from .llm import ClaudeClient
+from .memory import MemorySystem
+from .rate_limit import RateLimiter
+from .vector_store import NumpyVectorStore, VectorStore
+
+logger = logging.getLogger(__name__)
+
+NAMESPACES = ["MANA", "knowledge", "backrooms", "tweet"]
+ALLOCATION_ITERATIONS = 10
+
+
+@dataclass
+class BenchmarkConfig:
+    """Corpus size, iteration counts and injected upstream latencies (seconds)."""
+    corpus_size: int = 1000
+    dimension: int = 256
+    iterations: int = 50
+    warmup: int = 3
+    embedding_latency: float = 0.05
+    index_latency: float = 0.02
+    llm_latency: float = 0.5
+    latency_jitter: float = 0.2
+    seed: int = 0
+
+
+class UpstreamCalls:
+    """Counts calls made to each fake upstream."""
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+
+    def record(self, name: str):
+        self.counts[name] += 1
+
+    def snapshot(self) -> Counter:
+        return Counter(self.counts)
+
+
+def _jittered(latency: float, jitter: float) -> float:
+    return latency * random.uniform(1 - jitter, 1 + jitter) if latency > 0 else 0.0
+
+
+def fake_embedding(text: str, dimension: int) -> List[float]:
+    """Deterministic unit vector for a text."""
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    vector = np.random.default_rng(seed).normal(size=dimension).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class FakeEmbeddings:
+    """Stand-in for AsyncOpenAI().embeddings."""
+
+    def __init__(self, config: BenchmarkConfig, calls: UpstreamCalls):
+        self.config = config
+        self.calls = calls
+
+    async def create(self, model: str, input: List[str], **kwargs):
+        self.calls.record("openai.embeddings")
+        await asyncio.sleep(_jittered(self.config.embedding_latency, self.config.latency_jitter))
+        return types.SimpleNamespace(data=[
+            types.SimpleNamespace(index=i, embedding=fake_embedding(text, self.config.dimension))
+            for i, text in enumerate(input)
+        ])
+
+
+class FakeVectorStore(VectorStore):
+    """A local NumPy store that sleeps like a remote index and counts calls."""
+
+    def __init__(self, store: NumpyVectorStore, config: BenchmarkConfig, calls: UpstreamCalls):
+        self.store = store
+        self.config = config
+        self.calls = calls
+
+    def _call(self, op: str, *args, **kwargs):
+        self.calls.record(f"index.{op}")
+        # Index operations run in worker threads, so a blocking sleep is faithful
+        time.sleep(_jittered(self.config.index_latency, self.config.latency_jitter))
+        return getattr(self.store, op)(*args, **kwargs)
+
+    def query(self, *args, **kwargs):
+        return self._call("query", *args, **kwargs)
+
+    def upsert(self, *args, **kwargs):
+        return self._call("upsert", *args, **kwargs)
+
+    def fetch(self, *args, **kwargs):
+        return self._call("fetch", *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._call("delete", *args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        return self._call("update", *args, **kwargs)
+
+    def describe_index_stats(self):
+        return self._call("describe_index_stats")
+
+    def list_paginated(self, *args, **kwargs):
+        return self._call("list_paginated", *args, **kwargs)
+
+
+class FakeMessages:
+    """Stand-in for AsyncAnthropic().beta.messages."""
+
+    def __init__(self, config: BenchmarkConfig, calls: UpstreamCalls):
+        self.config = config
+        self.calls = calls
+
+    async def create(self, **request):
+        self.calls.record("anthropic.messages")
+        await asyncio.sleep(_jittered(self.config.llm_latency, self.config.latency_jitter))
+        prompt = request["messages"][0]["content"]
+        return types.SimpleNamespace(
+            content=[types.SimpleNamespace(text="*the terminal hums* terminal@backrooms:~/$ echo ok")],
+            usage=types.SimpleNamespace(input_tokens=len(prompt) // 4, output_tokens=16)
+        )
+
+
+class _Corpus:
+    """Synthetic documents and queries drawn from a fixed vocabulary."""
+
+    def __init__(self, seed: int, vocabulary_size: int = 5000):
+        self.rng = random.Random(seed)
+        self.vocabulary = [f"w{i}" for i in range(vocabulary_size)]
+
+    def text(self, words: int) -> str:
+        return " ".join(self.rng.choices(self.vocabulary, k=words))
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {'p50': None, 'p90': None, 'p99': None, 'mean': None, 'max': None}
+    data = np.asarray(values)
+    return {
+        'p50': float(np.percentile(data, 50)),
+        'p90': float(np.percentile(data, 90)),
+        'p99': float(np.percentile(data, 99)),
+        'mean': float(data.mean()),
+        'max': float(data.max())
+    }
+
+
+class Benchmark:
+    """Builds the pipeline on fake upstreams and measures its entry points."""
+
+    def __init__(self, config: BenchmarkConfig, workdir: Path):
+        self.config = config
+        self.calls = UpstreamCalls()
+        self.corpus = _Corpus(config.seed)
+        random.seed(config.seed)
+
+        self.store = store = NumpyVectorStore(workdir / "vector_store")
+        self._seed_store(store)
+        # Every local file lives in the work directory, never the production data
+        self.kb = KnowledgeBase(
+            store=FakeVectorStore(store, config, self.calls),
+            routing_path=workdir / "namespace_routing.json",
+            embedding_cache_path=workdir / "embedding_cache.sqlite3",
+            chunk_manifest_path=workdir / "chunk_manifest.sqlite3",
+            sidecar_path=workdir / "sidecar.sqlite3"
+        )
+        self.kb.openai = types.SimpleNamespace(embeddings=FakeEmbeddings(config, self.calls))
+        # No budgets or retries: measure the pipeline, not the provider limits
+        self.kb.embedding_limiter = RateLimiter("benchmark-openai", max_retries=0)
+
+        self.memory = MemorySystem(kb=self.kb, memory_file=workdir / "tweet_memory.json")
+
+        # An injected client needs no API key or network connection
+        self.claude = ClaudeClient(
+            client=types.SimpleNamespace(beta=types.SimpleNamespace(messages=FakeMessages(config, self.calls))),
+            limiter=RateLimiter("benchmark-anthropic", max_retries=0),
+            kb=self.kb,
+            memory=self.memory,
+            model="benchmark"
+        )
+
+    async def aclose(self):
+        """Close the knowledge base's local stores and the vector store."""
+        await self.kb.aclose()
+        self.store.close()
+
+    def _seed_store(self, store: NumpyVectorStore):
+        """Load the synthetic corpus directly, bypassing injected latency."""
+        per_namespace = max(1, self.config.corpus_size // len(NAMESPACES))
+        for namespace in NAMESPACES:
+            vectors = []
+            for i in range(per_namespace):
+                text = self.corpus.text(60)
+                vectors.append((
+                    f"{namespace}-{i}",
+                    fake_embedding(text, self.config.dimension),
+                    {'text': text, 'title': f"{namespace} {i}", 'category': namespace, 'tags': text.split()[:3]}
+                ))
+            for start in range(0, len(vectors), 1000):
+                store.upsert(vectors[start:start + 1000], namespace)
+        store.flush()
+
+    def operations(self) -> Dict[str, Callable[[], Awaitable]]:
+        corpus = self.corpus
+        fixed_query = corpus.text(8)
+        return {
+            'kb.search': lambda: self.kb.search(corpus.text(8)),
+            'kb.search_cached': lambda: self.kb.search(fixed_query),
+            'kb.search_hybrid': lambda: self.kb.search(corpus.text(8), mode="hybrid"),
+            'kb.search_many': lambda: self.kb.search_many([corpus.text(8) for _ in range(5)]),
+            'kb.add_document': lambda: self.kb.add_document(
+                corpus.text(400), {'title': corpus.text(3)}, namespace="knowledge"
+            ),
+            'memory.add_tweet': lambda: self.memory.add_tweet(
+                f"*{corpus.text(20)}* terminal@backrooms:~/$ {corpus.text(5)}", context=corpus.text(3)
+            ),
+            'claude.get_context': lambda: self.claude.get_context(corpus.text(4)),
+        }
+
+    async def _measure(self, operation: Callable[[], Awaitable], iterations: int, trace: bool) -> Dict:
+        latencies, peaks, nets, calls = [], [], [], Counter()
+        errors = 0
+        for _ in range(iterations):
+            before_calls = self.calls.snapshot()
+            if trace:
+                tracemalloc.reset_peak()
+                before_memory = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            try:
+                await operation()
+            except Exception as e:
+                errors += 1
+                logger.debug(f"Benchmark operation failed: {e}")
+            latencies.append((time.perf_counter() - start) * 1000)
+            if trace:
+                current, peak = tracemalloc.get_traced_memory()
+                peaks.append((peak - before_memory) / 1024)
+                nets.append((current - before_memory) / 1024)
+            calls.update(self.calls.snapshot() - before_calls)
+        return {'latencies': latencies, 'peaks': peaks, 'nets': nets, 'calls': calls, 'errors': errors}
+
+    async def run(self) -> Dict:
+        results = {}
+        for name, operation in self.operations().items():
+            logger.info(f"Benchmarking {name}...")
+            for _ in range(self.config.warmup):
+                try:
+                    await operation()
+                except Exception:
+                    pass
+
+            timed = await self._measure(operation, self.config.iterations, trace=False)
+
+            # Allocations are measured in a separate, shorter pass because
+            # tracing slows every allocation down
+            tracemalloc.start()
+            try:
+                traced = await self._measure(operation, min(self.config.iterations, ALLOCATION_ITERATIONS), trace=True)
+            finally:
+                tracemalloc.stop()
+
+            iterations = self.config.iterations
+            results[name] = {
+                'iterations': iterations,
+                'errors': timed['errors'],
+                'latency_ms': _percentiles(timed['latencies']),
+                'upstream_calls_per_op': {
+                    upstream: count / iterations for upstream, count in sorted(timed['calls'].items())
+                },
+                'allocations_kib': {
+                    'peak_p50': _percentiles(traced['peaks'])['p50'],
+                    'peak_max': _percentiles(traced['peaks'])['max'],
+                    'retained_mean': _percentiles(traced['nets'])['mean']
+                }
+            }
+        return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run_benchmarks(config: BenchmarkConfig) -> Dict:
+    """Run every benchmark and return the report."""
+    with tempfile.TemporaryDirectory(prefix="mana-benchmark-") as workdir:
+        benchmark = Benchmark(config, Path(workdir))
+        try:
+            operations = await benchmark.run()
+        finally:
+            await benchmark.aclose()
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'config': asdict(config),
+        'operations': operations
+    }
+
+
+def compare(baseline: Dict, current: Dict) -> List[str]:
+    """Lines comparing p50/p99 latency and upstream calls against a baseline report."""
+    lines = []
+    for name, result in current['operations'].items():
+        before = baseline.get('operations', {}).get(name)
+        if before is None:
+            lines.append(f"{name}: new")
+            continue
+        parts = []
+        for stat in ('p50', 'p99'):
+            old, new = before['latency_ms'][stat], result['latency_ms'][stat]
+            if old and new is not None:
+                parts.append(f"{stat} {old:.1f} -> {new:.1f} ms ({(new - old) / old:+.0%})")
+        old_calls = sum(before['upstream_calls_per_op'].values())
+        new_calls = sum(result['upstream_calls_per_op'].values())
+        parts.append(f"upstream calls {old_calls:.1f} -> {new_calls:.1f}")
+        lines.append(f"{name}: " + ", ".join(parts))
+    return lines
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    defaults = BenchmarkConfig()
+    for name, value in asdict(defaults).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    parser.add_argument("--output", type=Path, help="report path (default data/benchmarks/<commit or time>.json)")
+    parser.add_argument("--compare", type=Path, help="baseline report to compare against")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    for noisy in ("src.core.knowledge_base", "src.core.memory", "src.core.llm", "httpx"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+
+    config = BenchmarkConfig(**{name: getattr(args, name) for name in asdict(defaults)})
+    report = asyncio.run(run_benchmarks(config))
+
+    output = args.output or (
+        Path(__file__).parent.parent / "data" / "benchmarks"
+        / f"{report['commit'] or datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    for name, result in report['operations'].items():
+        latency = result['latency_ms']
+        logger.info(
+            f"{name}: p50 {latency['p50']:.1f} ms, p99 {latency['p99']:.1f} ms, "
+            f"{sum(result['upstream_calls_per_op'].values()):.1f} upstream calls, "
+            f"{result['errors']} errors"
+        )
+    if args.compare:
+        for line in compare(json.loads(args.compare.read_text()), report):
+            logger.info(line)
+    logger.info(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
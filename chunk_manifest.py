@@ -0,0 +1,67 @@
+"""Local record of which chunks are stored in each namespace."""
+
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from .sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkManifest(SQLiteStore):
+    """SQLite map of namespace -> document -> stored chunk IDs and (embedding, metadata) fingerprints."""
+
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS chunks (
+            namespace TEXT NOT NULL,
+            doc_id TEXT NOT NULL,
+            chunk_id TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            metadata_fingerprint TEXT NOT NULL DEFAULT '',
+            PRIMARY KEY (namespace, chunk_id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks(namespace, doc_id)",
+    )
+
+    def __init__(self, path: Optional[Path] = None):
+        super().__init__(path)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+        if "metadata_fingerprint" not in columns:
+            with self._conn:
+                self._conn.execute("ALTER TABLE chunks ADD COLUMN metadata_fingerprint TEXT NOT NULL DEFAULT ''")
+
+    def get(self, namespace: str, doc_id: str) -> Dict[str, Tuple[str, str]]:
+        """Stored chunk IDs of a document, mapped to their (embedding, metadata) fingerprints."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id, fingerprint, metadata_fingerprint FROM chunks WHERE namespace = ? AND doc_id = ?",
+                (namespace, doc_id)
+            ).fetchall()
+        return {chunk_id: (fingerprint, metadata_fingerprint) for chunk_id, fingerprint, metadata_fingerprint in rows}
+
+    def record(self, namespace: str, doc_id: str, chunks: Dict[str, Tuple[str, str]]):
+        """Replace a document's stored chunks."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks WHERE namespace = ? AND doc_id = ?", (namespace, doc_id))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (namespace, doc_id, chunk_id, fingerprint, metadata_fingerprint) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (namespace, doc_id, chunk_id, fingerprint, metadata_fingerprint)
+                    for chunk_id, (fingerprint, metadata_fingerprint) in chunks.items()
+                ]
+            )
+
+    def forget(self, namespace: str, chunk_ids: Iterable[str]):
+        """Drop chunks that were deleted from the index."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE namespace = ? AND chunk_id = ?",
+                [(namespace, chunk_id) for chunk_id in chunk_ids]
+            )
+
+    def clear(self, namespace: str):
+        """Drop every chunk of a namespace."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks WHERE namespace = ?", (namespace,))
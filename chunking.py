@@ -0,0 +1,162 @@
+"""Token-aware text chunking for embedding."""
+
+import functools
+import logging
+import re
+from typing import Iterator, List, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to the ~4 characters per token estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding(encoding_name: str):
+    """Load a tiktoken encoding once per process, or None if unavailable."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        logger.warning(f"Falling back to estimated token counts: {e}")
+        return None
+
+
+class TextChunker:
+    """Split text into chunks of at most max_tokens, with optional token overlap.
+
+    Paragraphs are packed greedily; a paragraph that is too long on its own
+    is split on sentence boundaries, and a sentence that is still too long
+    is split on token boundaries. Chunks are produced lazily, so only the
+    chunk being built is held in memory besides the source text.
+    """
+
+    def __init__(self, max_tokens: int = 8000, overlap_tokens: int = 0, encoding_name: str = "cl100k_base"):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self._encoding = _get_encoding(encoding_name)
+
+    def count_tokens(self, text: str) -> int:
+        """Count tokens exactly with tiktoken, or estimate at 4 characters per token."""
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    def _split_tokens(self, text: str, max_tokens: int) -> Iterator[Tuple[str, int]]:
+        """Hard-split text into pieces of at most max_tokens tokens."""
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            for i in range(0, len(tokens), max_tokens):
+                piece = tokens[i:i + max_tokens]
+                yield self._encoding.decode(piece), len(piece)
+        else:
+            step = max_tokens * 4
+            for i in range(0, len(text), step):
+                piece = text[i:i + step]
+                yield piece, self.count_tokens(piece)
+
+    def _tail(self, text: str, max_tokens: int) -> Tuple[str, int]:
+        """The last max_tokens tokens of text."""
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())[-max_tokens:]
+            return self._encoding.decode(tokens), len(tokens)
+        piece = text[-max_tokens * 4:]
+        return piece, self.count_tokens(piece)
+
+    def _iter_paragraphs(self, text: str) -> Iterator[str]:
+        """Yield paragraphs separated by blank lines without splitting the whole text up front."""
+        start = 0
+        while start <= len(text):
+            end = text.find("\n\n", start)
+            if end == -1:
+                end = len(text)
+            paragraph = text[start:end].strip()
+            if paragraph:
+                yield paragraph
+            start = end + 2
+
+    @staticmethod
+    def _iter_sentences(paragraph: str) -> Iterator[str]:
+        """Yield a paragraph's sentences one at a time rather than splitting them into a list."""
+        start = 0
+        for match in _SENTENCE_END.finditer(paragraph):
+            yield paragraph[start:match.start()]
+            start = match.end()
+        yield paragraph[start:]
+
+    def _iter_units(self, text: str, max_tokens: int) -> Iterator[Tuple[str, int, str]]:
+        """Yield (text, tokens, separator) units that each fit within max_tokens."""
+        for paragraph in self._iter_paragraphs(text):
+            tokens = self.count_tokens(paragraph)
+            if tokens <= max_tokens:
+                yield paragraph, tokens, "\n\n"
+                continue
+
+            separator = "\n\n"
+            for sentence in self._iter_sentences(paragraph):
+                tokens = self.count_tokens(sentence)
+                if tokens <= max_tokens:
+                    yield sentence, tokens, separator
+                else:
+                    for piece, piece_tokens in self._split_tokens(sentence, max_tokens):
+                        yield piece, piece_tokens, separator
+                        separator = ""
+                separator = " "
+
+    def iter_chunks(self, text: str) -> Iterator[str]:
+        """Yield chunks of text that each fit within max_tokens."""
+        max_tokens = self.max_tokens
+        # Every token is at least one character, so short texts need no counting
+        if len(text) <= max_tokens or (len(text) <= max_tokens * 8 and self.count_tokens(text) <= max_tokens):
+            yield text
+            return
+
+        overlap = min(self.overlap_tokens, max_tokens // 2)
+        current: List[Tuple[str, int, str]] = []
+        current_tokens = 0
+
+        # Keep units small enough that the overlap always fits in front of them
+        for unit in self._iter_units(text, max_tokens - overlap - 2 if overlap else max_tokens):
+            unit_tokens = unit[1] + 1  # Allow one token for the separator
+            if current and current_tokens + unit_tokens > max_tokens:
+                yield self._join(current)
+                current, current_tokens = self._overlap(current, overlap)
+                if current_tokens + unit_tokens > max_tokens:
+                    current, current_tokens = [], 0
+            current.append(unit)
+            current_tokens += unit_tokens
+
+        if current:
+            yield self._join(current)
+
+    def _overlap(self, units: List[Tuple[str, int, str]], overlap: int) -> Tuple[List[Tuple[str, int, str]], int]:
+        """Trailing units (trimmed to overlap tokens) to repeat at the start of the next chunk."""
+        if overlap <= 0:
+            return [], 0
+        kept: List[Tuple[str, int, str]] = []
+        kept_tokens = 0
+        for unit in reversed(units):
+            if kept_tokens + unit[1] + 1 <= overlap:
+                kept.insert(0, unit)
+                kept_tokens += unit[1] + 1
+                continue
+            if not kept:
+                tail, tail_tokens = self._tail(unit[0], overlap - 1)
+                kept.insert(0, (tail, tail_tokens, unit[2]))
+                kept_tokens += tail_tokens + 1
+            break
+        return kept, kept_tokens
+
+    @staticmethod
+    def _join(units: List[Tuple[str, int, str]]) -> str:
+        parts = []
+        for i, (text, _, separator) in enumerate(units):
+            if i:
+                parts.append(separator)
+            parts.append(text)
+        return "".join(parts)
@@ -0,0 +1,98 @@
+"""Process-wide registry of shared upstream clients."""
+
+import logging
+from typing import Dict, Optional
+
+import httpx
+from pinecone import Pinecone
+
+from ..config.settings import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_http_clients: Dict[str, httpx.AsyncClient] = {}
+_pinecone: Optional[Pinecone] = None
+_knowledge_base = None
+
+
+def get_http_client(
+    name: str,
+    max_connections: Optional[int] = None,
+    timeout: Optional[float] = None
+) -> httpx.AsyncClient:
+    """The shared keep-alive HTTP client for an upstream, created on first use.
+
+    max_connections and timeout only apply when the client is created.
+    Clients are bound to the event loop they are first used on, so call
+    aclose_all() before starting a new loop.
+    """
+    client = _http_clients.get(name)
+    if client is None or client.is_closed:
+        max_connections = max_connections or getattr(settings, "HTTP_MAX_CONNECTIONS", 20)
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=getattr(settings, "HTTP_KEEPALIVE_EXPIRY", 30.0)
+            ),
+            timeout=httpx.Timeout(timeout or getattr(settings, "HTTP_TIMEOUT", 30.0))
+        )
+        _http_clients[name] = client
+        logger.info(f"Created shared HTTP client for {name} ({max_connections} connections)")
+    return client
+
+
+def get_pinecone() -> Pinecone:
+    """The shared Pinecone client."""
+    global _pinecone
+    if _pinecone is None:
+        _pinecone = Pinecone(api_key=settings.PINECONE_API_KEY)
+    return _pinecone
+
+
+def get_knowledge_base():
+    """The shared KnowledgeBase, created on first use."""
+    global _knowledge_base
+    if _knowledge_base is None:
+        from .knowledge_base import KnowledgeBase
+        _knowledge_base = KnowledgeBase()
+    return _knowledge_base
+
+
+def pool_stats() -> Dict[str, Dict]:
+    """Connection and request counts for each shared HTTP pool."""
+    stats = {}
+    for name, client in _http_clients.items():
+        # httpx doesn't expose pool state publicly; read it from httpcore
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        requests = list(getattr(pool, "_requests", []))
+        queued = sum(1 for request in requests if request.is_queued())
+        stats[name] = {
+            'closed': client.is_closed,
+            'connections': len(connections),
+            'idle_connections': sum(1 for connection in connections if connection.is_idle()),
+            'active_requests': len(requests) - queued,
+            'queued_requests': queued
+        }
+    return stats
+
+
+async def aclose_all():
+    """Shut down the shared KnowledgeBase and close every shared connection pool."""
+    global _knowledge_base, _pinecone
+    if _knowledge_base is not None:
+        try:
+            await _knowledge_base.aclose()
+        except Exception as e:
+            logger.error(f"Error closing knowledge base: {e}")
+        _knowledge_base = None
+
+    for name, client in list(_http_clients.items()):
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.error(f"Error closing {name} HTTP client: {e}")
+    _http_clients.clear()
+    _pinecone = None
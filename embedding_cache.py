@@ -0,0 +1,169 @@
+"""Two-tier embedding cache: in-memory LRU in front of an on-disk SQLite store."""
+
+import hashlib
+import logging
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .cache import LRUCache
+from .sqlite_store import connect
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """Content-addressed cache for embeddings keyed by model and normalized text."""
+
+    TOUCH_FLUSH_SIZE = 256
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        memory_size: int = 4096,
+        disk_max_entries: int = 200000
+    ):
+        self.memory = LRUCache(max_size=memory_size)
+        self.disk_max_entries = disk_max_entries
+        self.path = path
+        self.disk_hits = 0
+        self.disk_evictions = 0
+        self._writes_since_prune = 0
+        # Disk keys read since the last flush, with their access times
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if path:
+            try:
+                self._conn = connect(path)
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+                self._conn.execute(
+                    """CREATE TABLE IF NOT EXISTS embeddings (
+                        key TEXT PRIMARY KEY,
+                        model TEXT NOT NULL,
+                        vector BLOB NOT NULL,
+                        last_access REAL NOT NULL
+                    )"""
+                )
+                self._conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)"
+                )
+                self._conn.commit()
+            except Exception as e:
+                logger.warning(f"Embedding disk cache disabled ({path}): {e}")
+                self._conn = None
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize text so trivially different inputs share a cache entry."""
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    @classmethod
+    def make_key(cls, model: str, text: str) -> str:
+        """Hash model and normalized text into a cache key."""
+        payload = f"{model}\x00{cls.normalize(text)}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """Look up an embedding, checking memory first and then disk."""
+        key = self.make_key(model, text)
+        embedding = self.memory.get(key)
+        if embedding is not None:
+            return embedding
+
+        if self._conn is None:
+            return None
+
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT vector FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                # Disk hits don't write; access times are flushed in batches
+                self._touched[key] = time.time()
+                if len(self._touched) >= self.TOUCH_FLUSH_SIZE:
+                    self._flush_touches()
+                    self._conn.commit()
+                self.disk_hits += 1
+            embedding = np.frombuffer(row[0], dtype=np.float32).tolist()
+            self.memory.set(key, embedding)
+            return embedding
+        except Exception as e:
+            logger.warning(f"Embedding disk cache read failed: {e}")
+            return None
+
+    def set(self, model: str, text: str, embedding: List[float]):
+        """Store an embedding in both tiers."""
+        key = self.make_key(model, text)
+        self.memory.set(key, embedding)
+
+        if self._conn is None:
+            return
+
+        try:
+            blob = np.asarray(embedding, dtype=np.float32).tobytes()
+            with self._lock:
+                self._flush_touches()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, model, vector, last_access) VALUES (?, ?, ?, ?)",
+                    (key, model, blob, time.time())
+                )
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= 256:
+                    self._prune()
+                self._conn.commit()
+        except Exception as e:
+            logger.warning(f"Embedding disk cache write failed: {e}")
+
+    def _flush_touches(self):
+        """Write buffered access times; the caller commits."""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _prune(self):
+        """Evict least recently used disk entries beyond disk_max_entries."""
+        self._writes_since_prune = 0
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.disk_max_entries
+        if excess > 0:
+            self._conn.execute(
+                """DELETE FROM embeddings WHERE key IN (
+                    SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?
+                )""",
+                (excess,)
+            )
+            self.disk_evictions += excess
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters for both tiers."""
+        memory_stats = self.memory.stats()
+        disk_misses = memory_stats['misses'] - self.disk_hits
+        lookups = memory_stats['hits'] + memory_stats['misses']
+        return {
+            'memory': memory_stats,
+            'disk_enabled': self._conn is not None,
+            'disk_hits': self.disk_hits,
+            'disk_evictions': self.disk_evictions,
+            'misses': disk_misses,
+            'hit_rate': (lookups - disk_misses) / lookups if lookups else None
+        }
+
+    def close(self):
+        """Flush and close the disk store."""
+        if self._conn is not None:
+            with self._lock:
+                self._flush_touches()
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,151 @@
+"""In-memory index statistics refreshed in the background."""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class IndexStatsCache:
+    """Namespace vector counts served from memory, refreshed in the background and adjusted by local writes."""
+
+    def __init__(
+        self,
+        fetch: Callable[[], Awaitable],
+        refresh_interval: float = 30.0,
+        max_staleness: float = 300.0
+    ):
+        self._fetch = fetch
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self.counts: Dict[str, int] = {}
+        self.refreshed_at: Optional[float] = None
+        self.refreshes = 0
+        self.failures = 0
+        # Set by writes whose effect on the counts is unknown until a refresh lands
+        self.stale = False
+        self._refresh: Optional[asyncio.Future] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        # Writes made while a refresh is in flight, reapplied to its result
+        self._pending: Optional[Dict[str, int]] = None
+        self._emptied: Optional[set] = None
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the last successful refresh."""
+        return None if self.refreshed_at is None else time.monotonic() - self.refreshed_at
+
+    async def refresh(self) -> Dict[str, int]:
+        """Reload counts from the index, sharing any refresh already in flight."""
+        loop = asyncio.get_running_loop()
+        if self._refresh is None or self._refresh.done() or self._refresh.get_loop() is not loop:
+            self._refresh = asyncio.ensure_future(self._load())
+        return await asyncio.shield(self._refresh)
+
+    async def _load(self) -> Dict[str, int]:
+        self._pending, self._emptied = {}, set()
+        # Invalidations after this point must survive the refresh
+        was_stale, self.stale = self.stale, False
+        try:
+            stats = await self._fetch()
+        except Exception:
+            self.failures += 1
+            self.stale = self.stale or was_stale
+            raise
+        finally:
+            pending, self._pending = self._pending, None
+            emptied, self._emptied = self._emptied, None
+
+        counts = {
+            namespace: info.get("vector_count", 0)
+            for namespace, info in stats.namespaces.items()
+        }
+        for namespace in emptied:
+            counts[namespace] = 0
+        for namespace, delta in pending.items():
+            counts[namespace] = max(0, counts.get(namespace, 0) + delta)
+        self.counts = counts
+        self.refreshed_at = time.monotonic()
+        self.refreshes += 1
+        return counts
+
+    async def _refresh_periodically(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing index stats: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def _ensure_refreshing(self):
+        """Start the background refresh task on the running loop if it isn't running."""
+        loop = asyncio.get_running_loop()
+        task = self._refresh_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._refresh_task = loop.create_task(self._refresh_periodically())
+
+    async def get_counts(self) -> Dict[str, int]:
+        """Vector counts per namespace, from memory whenever they are fresh enough."""
+        self._ensure_refreshing()
+        age = self.age
+        if age is None or age > self.max_staleness:
+            try:
+                await self.refresh()
+            except Exception as e:
+                if self.refreshed_at is None:
+                    raise
+                logger.warning(f"Serving index stats {self.age:.0f}s old: {e}")
+        elif self.stale:
+            self._refresh_in_background()
+        return dict(self.counts)
+
+    async def get_count(self, namespace: str) -> int:
+        """Vector count of one namespace."""
+        counts = await self.get_counts()
+        return counts.get(namespace, 0)
+
+    def adjust(self, namespace: str, delta: int):
+        """Optimistically apply a local write until the next refresh."""
+        if self.refreshed_at is not None:
+            self.counts[namespace] = max(0, self.counts.get(namespace, 0) + delta)
+        if self._pending is not None:
+            self._pending[namespace] = self._pending.get(namespace, 0) + delta
+
+    def reset(self, namespace: str):
+        """Record that a namespace was emptied."""
+        self.counts[namespace] = 0
+        if self._pending is not None:
+            self._pending.pop(namespace, None)
+            self._emptied.add(namespace)
+
+    def _refresh_in_background(self):
+        """Start a refresh without waiting for it, if one isn't already running."""
+        if self._refresh is not None and not self._refresh.done():
+            return
+        asyncio.ensure_future(self.refresh()).add_done_callback(self._log_refresh_failure)
+
+    @staticmethod
+    def _log_refresh_failure(task: asyncio.Future):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error refreshing index stats: {task.exception()}")
+
+    def invalidate(self):
+        """Mark the counts stale and refresh them in the background; reads get the last counts meanwhile."""
+        self.stale = True
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return  # The next read starts the refresh
+        self._refresh_in_background()
+
+    async def aclose(self):
+        """Stop the background refresh."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except (asyncio.CancelledError, RuntimeError):
+                pass
+            self._refresh_task = None
@@ -0,0 +1,321 @@
+"""Resumable bulk ingestion of documents into the knowledge base."""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from functools import cached_property
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .knowledge_base import ChunkPlan, DocumentPlan, KnowledgeBase
+
+logger = logging.getLogger(__name__)
+
+TEXT_SUFFIXES = (".txt", ".md")
+
+
+@dataclass
+class SourceDocument:
+    """A document read from an ingestion source."""
+    doc_id: str
+    text: str
+    metadata: Dict = field(default_factory=dict)
+
+    @cached_property
+    def digest(self) -> str:
+        """Hash of the text and metadata, so an edited or retagged document isn't mistaken for an ingested one."""
+        content = hashlib.sha256(self.text.encode("utf-8"))
+        content.update(b"\x00" + json.dumps(self.metadata, sort_keys=True, default=str).encode("utf-8"))
+        return content.hexdigest()
+
+
+@dataclass
+class IngestionStats:
+    """Counters and throughput for one ingestion run."""
+    documents: int = 0
+    chunks: int = 0
+    unchanged: int = 0
+    skipped: int = 0
+    failed: int = 0
+    started: float = field(default_factory=time.monotonic)
+    finished: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def documents_per_second(self) -> float:
+        return self.documents / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.documents} documents ({self.documents_per_second:.1f}/s), "
+            f"{self.chunks} chunks ({self.chunks_per_second:.1f}/s), "
+            f"{self.unchanged} unchanged, {self.skipped} skipped, {self.failed} failed in {self.elapsed:.1f}s"
+        )
+
+
+def iter_source(path) -> Iterator[SourceDocument]:
+    """Read documents from a JSONL file, a text file, or a directory of text files.
+
+    JSONL records need a "text" field; "id" is optional and "metadata" (or
+    else the remaining fields) becomes the document metadata. Records with
+    no id get one derived from their source, title or text, as add_document does, so
+    inserting a line doesn't shift the IDs of the ones after it. Text files
+    are identified by their path relative to the source directory.
+    """
+    path = Path(path)
+    if path.is_dir():
+        for file in sorted(p for p in path.rglob("*") if p.suffix in TEXT_SUFFIXES and p.is_file()):
+            relative = file.relative_to(path).as_posix()
+            yield SourceDocument(
+                relative,
+                file.read_text(encoding="utf-8"),
+                {'title': file.stem, 'source': relative}
+            )
+    elif path.suffix == ".jsonl":
+        with open(path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    text = record['text']
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.error(f"Skipping {path.name}:{line_number}: {e}")
+                    continue
+                metadata = record.get('metadata') or {
+                    key: value for key, value in record.items() if key not in ('id', 'text')
+                }
+                doc_id = record.get('id') or KnowledgeBase._document_id(text, metadata)
+                yield SourceDocument(str(doc_id), text, metadata)
+    else:
+        yield SourceDocument(path.name, path.read_text(encoding="utf-8"), {'title': path.stem, 'source': path.name})
+
+
+class IngestionCheckpoint:
+    """Append-only record of fully ingested documents.
+
+    Each line is a JSON-encoded [doc_id, content digest] pair, so a document
+    whose text or metadata changed no longer matches and is ingested again. A line torn by a
+    crash is simply ignored on the next load, and that document is
+    ingested again too.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.done: Set[Tuple[str, str]] = set()
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        doc_id, digest = json.loads(line)
+                    except (ValueError, TypeError):
+                        continue
+                    self.done.add((doc_id, digest))
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def __contains__(self, doc: SourceDocument) -> bool:
+        return (doc.doc_id, doc.digest) in self.done
+
+    def mark_done(self, docs: List[SourceDocument]):
+        """Record documents as ingested."""
+        for doc in docs:
+            self._file.write(json.dumps([doc.doc_id, doc.digest]) + "\n")
+        self._file.flush()
+        self.done.update((doc.doc_id, doc.digest) for doc in docs)
+
+    def close(self):
+        self._file.close()
+
+
+# A document and the plan of one window of its chunks, and after embedding, their vectors
+_Chunked = Tuple[SourceDocument, ChunkPlan]
+_Embedded = Tuple[SourceDocument, ChunkPlan, List[Dict]]
+
+
+class IngestionPipeline:
+    """Stream documents through chunking, batched embedding and batched upsert.
+
+    The stages run concurrently, connected by bounded queues so a slow
+    stage holds back the ones before it instead of buffering the corpus in
+    memory: at most two embedding batches' worth of chunks wait to be
+    embedded, and queue_size embedded batches wait to be upserted. Documents are checkpointed once every chunk has been written,
+    so rerunning over the same source skips them; with a fresh checkpoint,
+    the knowledge base's chunk manifest still skips unchanged chunks.
+    """
+
+    def __init__(
+        self,
+        kb,
+        namespace: str = "backrooms",
+        checkpoint_path=None,
+        embed_batch_size: int = 256,
+        queue_size: int = 8,
+        embed_workers: int = 2,
+        upsert_workers: int = 2,
+        report_interval: float = 10.0
+    ):
+        self.kb = kb
+        self.namespace = namespace
+        self.checkpoint_path = checkpoint_path or (
+            Path(__file__).parent.parent / "data" / "ingest" / f"{namespace}.checkpoint"
+        )
+        self.embed_batch_size = embed_batch_size
+        self.queue_size = queue_size
+        self.embed_workers = embed_workers
+        self.upsert_workers = upsert_workers
+        self.report_interval = report_interval
+
+    async def run(self, source) -> IngestionStats:
+        """Ingest every document from source not already checkpointed."""
+        stats = IngestionStats()
+        checkpoint = IngestionCheckpoint(self.checkpoint_path)
+        # Bounded by the chunks in its windows rather than by window count
+        chunked: asyncio.Queue = asyncio.Queue()
+        chunk_limit = 2 * self.embed_batch_size
+        queued_chunks = [0]
+        room = asyncio.Condition()
+        embedded: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        last_report = [time.monotonic()]
+
+        async def read():
+            documents = iter_source(source)
+
+            def next_document() -> Optional[SourceDocument]:
+                doc = next(documents, None)
+                if doc is not None:
+                    doc.digest  # Hash here rather than on the event loop
+                return doc
+
+            while True:
+                # File reads, hashing and chunking happen off the event loop
+                doc = await asyncio.to_thread(next_document)
+                if doc is None:
+                    break
+                if doc in checkpoint or not doc.text.strip():
+                    stats.skipped += 1
+                    continue
+                plans = self._plan(doc)
+                while True:
+                    plan = await asyncio.to_thread(next, plans, None)
+                    if plan is None:
+                        break
+                    if plan.pending or plan.relabel:
+                        async with room:
+                            # An oversized window still goes through on its own
+                            await room.wait_for(
+                                lambda: not queued_chunks[0] or queued_chunks[0] + len(plan.chunks) <= chunk_limit
+                            )
+                            queued_chunks[0] += len(plan.chunks)
+                        await chunked.put((doc, plan))
+                        continue
+                    # Nothing to embed or update, but the last window drops old chunks
+                    await self.kb.store_plans([plan], [[]], self.namespace)
+                    if plan.document.complete and self._settle(doc, plan.document, stats):
+                        checkpoint.mark_done([doc])
+            for _ in range(self.embed_workers):
+                await chunked.put(None)
+
+        async def embed():
+            finished = False
+            while not finished:
+                # Gather documents until the batch is full or the queue runs dry
+                batch: List[_Chunked] = []
+                batch_chunks = 0
+                item = await chunked.get()
+                while item is not None:
+                    batch.append(item)
+                    batch_chunks += len(item[1].pending)
+                    if batch_chunks >= self.embed_batch_size or chunked.empty():
+                        break
+                    item = chunked.get_nowait()
+                finished = item is None
+                if batch:
+                    embedded_batch = await self._embed_batch(batch)
+                    async with room:
+                        queued_chunks[0] -= sum(len(plan.chunks) for _, plan in batch)
+                        room.notify_all()
+                    await embedded.put(embedded_batch)
+
+        async def embed_stage():
+            await asyncio.gather(*(embed() for _ in range(self.embed_workers)))
+            for _ in range(self.upsert_workers):
+                await embedded.put(None)
+
+        async def upsert():
+            while True:
+                batch = await embedded.get()
+                if batch is None:
+                    return
+                done = await self._upsert_batch(batch, stats)
+                checkpoint.mark_done(done)
+                if time.monotonic() - last_report[0] >= self.report_interval:
+                    last_report[0] = time.monotonic()
+                    logger.info(f"Ingesting into {self.namespace}: {stats}")
+
+        tasks = [
+            asyncio.ensure_future(read()),
+            asyncio.ensure_future(embed_stage()),
+            *(asyncio.ensure_future(upsert()) for _ in range(self.upsert_workers))
+        ]
+        try:
+            # A failing stage would leave the others blocked on its queue
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            checkpoint.close()
+            stats.finished = time.monotonic()
+            logger.info(f"Ingestion into {self.namespace} finished: {stats}")
+
+        return stats
+
+    def _plan(self, doc: SourceDocument) -> Iterator[ChunkPlan]:
+        """Chunk a document, working out a window at a time which chunks need embedding."""
+        return self.kb.plan_document(doc.doc_id, doc.text, doc.metadata, self.namespace)
+
+    @staticmethod
+    def _settle(doc: SourceDocument, document: DocumentPlan, stats: IngestionStats) -> bool:
+        """Count a document whose last window is in, returning whether it can be checkpointed."""
+        if document.failed:
+            logger.error(f"Document {doc.doc_id} was only partly ingested; it will be retried on the next run")
+            stats.failed += 1
+            return False
+        if document.unchanged:
+            stats.unchanged += 1
+        else:
+            stats.documents += 1
+        return True
+
+    async def _embed_batch(self, batch: List[_Chunked]) -> List[_Embedded]:
+        """Embed every pending chunk in the batch with as few requests as possible."""
+        vectors = await self.kb.embed_plans([plan for _, plan in batch])
+        return [(doc, plan, plan_vectors) for (doc, plan), plan_vectors in zip(batch, vectors)]
+
+    async def _upsert_batch(self, batch: List[_Embedded], stats: IngestionStats) -> List[SourceDocument]:
+        """Upsert a batch of embedded windows, returning the documents now fully written."""
+        success = await self.kb.store_plans(
+            [plan for _, plan, _ in batch],
+            [vectors for _, _, vectors in batch],
+            self.namespace
+        )
+
+        done = []
+        for (doc, plan, _), plan_success in zip(batch, success):
+            stats.chunks += sum(plan_success[i] for i in plan.pending)
+            if plan.document.complete and self._settle(doc, plan.document, stats):
+                done.append(doc)
+        return done
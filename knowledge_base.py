@@ -1,9 +1,25 @@
-from typing import List, Dict, Optional
-from pinecone import Pinecone
-from openai import OpenAI
+from typing import List, Dict, Optional, AsyncIterator, Iterator, Tuple
+from dataclasses import dataclass, field
+from openai import AsyncOpenAI
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
 import numpy as np
 from ..config.settings import get_settings
-import uuid
+from .cache import LRUCache
+from .embedding_cache import EmbeddingCache
+from .vector_store import VectorStore, PineconeVectorStore, NumpyVectorStore, Vector, Match, project_metadata, to_vector, matches_filter
+from .chunking import TextChunker
+from .chunk_manifest import ChunkManifest
+from .sidecar_store import SidecarStore
+from .index_stats import IndexStatsCache
+from .clients import get_http_client, get_pinecone
+from .metrics import EMBEDDING_SECONDS, EMBEDDING_TEXTS, INDEX_SECONDS
+from .rate_limit import get_rate_limiter, get_store_limiter
+from .lexical_index import BM25Index, reciprocal_rank_fusion
+from .similarity import MinHashLSH, word_set, jaccard, cosine_pairs_above, cluster_pairs
+import hashlib
 import json
 from pathlib import Path
 import random
@@ -14,275 +30,1319 @@ from datetime import datetime
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
+# Set inside a write already counted against the write barrier, so its own index writes pass
+_in_write = contextvars.ContextVar("in_write", default=False)
+
+@dataclass
+class AddDocumentResult:
+    """Per-chunk outcome of KnowledgeBase.add_document."""
+    doc_id: str
+    chunk_ids: List[str] = field(default_factory=list)
+    chunk_success: List[bool] = field(default_factory=list)
+    unchanged_chunks: int = 0
+    relabeled_chunks: int = 0
+
+    @property
+    def failed_chunks(self) -> List[int]:
+        """Indices of chunks that were not stored."""
+        return [i for i, ok in enumerate(self.chunk_success) if not ok]
+
+    def __bool__(self) -> bool:
+        return bool(self.chunk_success) and all(self.chunk_success)
+
+@dataclass
+class DocumentPlan:
+    """A document being written a window of chunks at a time, with what the manifest held for it before."""
+    doc_id: str
+    previous: Dict[str, Tuple[str, str]]
+    chunk_ids: List[str] = field(default_factory=list)
+    stored: Dict[str, Tuple[str, str]] = field(default_factory=dict)
+    # Occurrences of each chunk digest so far, to tell repeated chunks apart
+    seen: Dict[str, int] = field(default_factory=dict)
+    changed: int = 0
+    failed: int = 0
+    windows: int = 0
+    finished_windows: int = 0
+    planned: bool = False
+
+    @property
+    def stale_ids(self) -> List[str]:
+        """Chunks the previous version had but this one doesn't."""
+        return sorted(set(self.previous) - set(self.chunk_ids))
+
+    @property
+    def complete(self) -> bool:
+        """Whether every window has been planned and finished."""
+        return self.planned and self.finished_windows == self.windows
+
+    @property
+    def unchanged(self) -> bool:
+        return self.planned and not self.changed and not self.stale_ids
+
+@dataclass
+class ChunkPlan:
+    """A window of a document's chunks: pending ones need embedding, relabel ones only a metadata update."""
+    doc_id: str
+    chunks: List[str]
+    chunk_ids: List[str]
+    metadata: List[Dict]
+    fingerprints: List[str]
+    metadata_fingerprints: List[str]
+    pending: List[int]
+    relabel: List[int]
+    document: DocumentPlan
+    start: int = 0
+    full_metadata: Dict = field(default_factory=dict)
+
+@dataclass
+class DocumentBatch:
+    """A page of exported documents and the cursor that resumes after it."""
+    documents: List[Dict]
+    cursor: Optional[str] = None
+
+@dataclass
+class ConceptPool:
+    """Prefetched random concepts for one namespace."""
+    matches: List = field(default_factory=list)
+    served: set = field(default_factory=set)
+    refill: Optional[asyncio.Task] = None
+
 class KnowledgeBase:
-    def __init__(self):
-        """Initialize connection to Pinecone and OpenAI."""
+    # OpenAI accepts up to 2048 inputs and ~300k tokens per embeddings request
+    MAX_EMBEDDING_INPUTS = 2048
+    MAX_EMBEDDING_BATCH_TOKENS = 300000
+    # Pinecone recommends upserting at most 100 vectors per request
+    UPSERT_BATCH_SIZE = 100
+    # Candidates taken from each retriever before reciprocal-rank fusion
+    HYBRID_CANDIDATES = 20
+    # Full output size of the embedding model
+    NATIVE_EMBEDDING_DIMENSIONS = 1536
+
+    def __init__(
+        self,
+        store: Optional[VectorStore] = None,
+        routing_path: Optional[Path] = None,
+        embedding_cache_path: Optional[Path] = None,
+        chunk_manifest_path: Optional[Path] = None,
+        sidecar_path: Optional[Path] = None
+    ):
+        """Initialize the vector store and OpenAI, keeping local state at the given or configured paths."""
         try:
-            # Initialize Pinecone
-            self.pc = Pinecone(api_key=settings.PINECONE_API_KEY)
-            self.index = self.pc.Index(settings.PINECONE_INDEX)
+            # A completed migration may have moved the knowledge base to another store
+            self.routing_path = Path(routing_path or getattr(
+                settings,
+                "NAMESPACE_ROUTING_PATH",
+                Path(__file__).parent.parent / "data" / "namespace_routing.json"
+            ))
+            routing = self._read_namespace_routing()
+            
+            # Initialize the vector store (Pinecone unless configured otherwise)
+            self.index = store or self._create_vector_store(routing.get('store'))
+            self.index_limiter = get_store_limiter(self.index)
             self.namespace = "knowledge"
+            self.namespace_timeout = getattr(settings, "SEARCH_NAMESPACE_TIMEOUT", 5.0)
+            
+            # Random concept sampling pools, one per namespace
+            self._concept_pools: Dict[str, ConceptPool] = {}
+            self.concept_pool_size = getattr(settings, "CONCEPT_POOL_SIZE", 50)
+            self.concept_pool_low_water = self.concept_pool_size // 5
+            
+            # Fetched vectors and metadata keyed by (namespace, id)
+            self._vector_cache = LRUCache(max_size=getattr(settings, "VECTOR_CACHE_SIZE", 2048))
+            
+            # Search results keyed by (query, namespaces, top_k), checked
+            # against per-namespace write generations
+            self._search_cache = LRUCache(
+                max_size=getattr(settings, "SEARCH_CACHE_SIZE", 1024),
+                ttl=getattr(settings, "SEARCH_CACHE_TTL", 300.0)
+            )
+            self._search_cache_stale = 0
+            self._namespace_generations: Dict[str, int] = {}
+            # Bumped by switch_index, which invalidates every namespace at once
+            self._index_epoch = 0
+            
+            # Local BM25 indexes, built per namespace on first lexical use
+            self._lexical_indexes: Dict[str, BM25Index] = {}
+            self._lexical_builds: Dict[str, asyncio.Future] = {}
+            # Writes that land while a namespace's index is being built
+            self._lexical_pending: Dict[str, List[Tuple[str, Dict]]] = {}
+            self.embedding_fallback_timeout = getattr(settings, "EMBEDDING_FALLBACK_TIMEOUT", 2.0)
+            
+            # Namespace counts served from memory, refreshed in the background
+            self.index_stats = IndexStatsCache(
+                lambda: self.index_op("describe_index_stats"),
+                refresh_interval=getattr(settings, "INDEX_STATS_REFRESH_INTERVAL", 30.0),
+                max_staleness=getattr(settings, "INDEX_STATS_MAX_STALENESS", 300.0)
+            )
+            
+            # Initialize OpenAI on the shared pooled async HTTP client so
+            # embeddings don't block the event loop
+            max_concurrency = getattr(settings, "EMBEDDING_MAX_CONCURRENCY", 8)
+            self.embedding_http_client = get_http_client(
+                "openai",
+                max_connections=max_concurrency,
+                timeout=getattr(settings, "EMBEDDING_TIMEOUT", 30.0)
+            )
+            self.openai = AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                http_client=self.embedding_http_client,
+                max_retries=0
+            )
+            self.embedding_limiter = get_rate_limiter("openai")
+            self._embedding_semaphore = asyncio.Semaphore(max_concurrency)
+            self.embedding_model = "text-embedding-3-small"
+            self.embedding_dimensions = getattr(settings, "EMBEDDING_DIMENSIONS", self.NATIVE_EMBEDDING_DIMENSIONS)
+            
+            # Logical -> physical namespace aliases left by an embedding migration
+            self.namespace_aliases: Dict[str, str] = {}
+            # Migrations in progress, which mirror every write into their targets
+            self._write_mirrors: List = []
+            # Set while writes are held back, e.g. for a migration's switch-over
+            self._write_barrier: Optional[asyncio.Future] = None
+            self._writes_drained: Optional[asyncio.Future] = None
+            self._writes_in_flight = 0
+            self._load_namespace_routing(routing)
+            self.chunker = TextChunker(
+                max_tokens=getattr(settings, "CHUNK_MAX_TOKENS", 8000),
+                overlap_tokens=getattr(settings, "CHUNK_OVERLAP_TOKENS", 0)
+            )
+            # Chunks planned and embedded at a time, bounding memory on huge documents
+            self.chunk_window_size = getattr(settings, "CHUNK_WINDOW_SIZE", 256)
             
-            # Initialize OpenAI
-            self.openai = OpenAI(api_key=settings.OPENAI_API_KEY)
-            logger.info(f"Connected to Pinecone index: {settings.PINECONE_INDEX}")
+            # Embedding cache (memory LRU + on-disk store)
+            cache_path = embedding_cache_path or getattr(
+                settings,
+                "EMBEDDING_CACHE_PATH",
+                Path(__file__).parent.parent / "data" / "embedding_cache.sqlite3"
+            )
+            # Chunks already stored, so re-ingesting unchanged content is free
+            manifest_path = chunk_manifest_path or getattr(
+                settings,
+                "CHUNK_MANIFEST_PATH",
+                Path(__file__).parent.parent / "data" / "chunk_manifest.sqlite3"
+            )
+            self.chunk_manifest = ChunkManifest(Path(manifest_path) if manifest_path else None)
+            
+            # Full text and metadata of each chunk; the index only holds slim fields
+            sidecar_path = sidecar_path or getattr(
+                settings,
+                "SIDECAR_PATH",
+                Path(__file__).parent.parent / "data" / "sidecar.sqlite3"
+            )
+            self.sidecar = SidecarStore(Path(sidecar_path) if sidecar_path else None)
+            
+            self.embedding_cache = EmbeddingCache(
+                path=Path(cache_path) if cache_path else None,
+                memory_size=getattr(settings, "EMBEDDING_CACHE_MEMORY_SIZE", 4096),
+                disk_max_entries=getattr(settings, "EMBEDDING_CACHE_DISK_MAX_ENTRIES", 200000)
+            )
         except Exception as e:
             logger.error(f"Error initializing services: {e}")
             raise
 
+    def _create_vector_store(self, location: Optional[Dict] = None) -> VectorStore:
+        """Create the vector store recorded by a migration, or else the one selected by VECTOR_STORE_BACKEND."""
+        if location:
+            if location.get('backend') == "numpy":
+                logger.info(f"Using migrated NumPy vector store at {location['path']}")
+                return NumpyVectorStore(Path(location['path']))
+            if location.get('backend') == "pinecone":
+                self.pc = get_pinecone()
+                logger.info(f"Connected to migrated Pinecone index: {location['index']}")
+                return PineconeVectorStore(self.pc.Index(location['index']), name=location['index'])
+            logger.error(f"Unknown vector store in namespace routing: {location}")
+        
+        backend = getattr(settings, "VECTOR_STORE_BACKEND", "pinecone")
+        if backend == "numpy":
+            path = getattr(
+                settings,
+                "VECTOR_STORE_PATH",
+                Path(__file__).parent.parent / "data" / "vector_store"
+            )
+            logger.info(f"Using local NumPy vector store at {path}")
+            return NumpyVectorStore(Path(path))
+        
+        self.pc = get_pinecone()
+        logger.info(f"Connected to Pinecone index: {settings.PINECONE_INDEX}")
+        return PineconeVectorStore(self.pc.Index(settings.PINECONE_INDEX), name=settings.PINECONE_INDEX)
+
+    async def index_op(self, op: str, **kwargs):
+        """Run a rate-limited index operation in a worker thread, gating, invalidating and mirroring writes."""
+        if op not in ("upsert", "delete", "update"):
+            return await self._index_op(op, **kwargs)
+        
+        async with self._write_slot():
+            result = await self._index_op(op, **kwargs)
+            for migration in list(self._write_mirrors):
+                await migration.mirror(op, kwargs)
+            return result
+
+    @contextlib.asynccontextmanager
+    async def _write_slot(self):
+        """Count a write as in flight, first waiting out any write barrier; nested slots pass straight through."""
+        if _in_write.get():
+            yield
+            return
+        while self._write_barrier is not None:
+            await asyncio.shield(self._write_barrier)
+        self._writes_in_flight += 1
+        token = _in_write.set(True)
+        try:
+            yield
+        finally:
+            _in_write.reset(token)
+            self._writes_in_flight -= 1
+            drained = self._writes_drained
+            if not self._writes_in_flight and drained is not None and not drained.done():
+                drained.set_result(None)
+
+    async def _index_op(self, op: str, **kwargs):
+        """Run an index operation without waiting on the write barrier or mirroring it."""
+        is_write = op in ("upsert", "delete", "update")
+        if is_write:
+            self._invalidate_vectors(op, kwargs)
+            self._bump_namespace_generation(kwargs.get('namespace', ''))
+        try:
+            # Caches are keyed by logical namespace; only the store sees aliases
+            call_kwargs = kwargs
+            if 'namespace' in kwargs:
+                call_kwargs = dict(kwargs, namespace=self.resolve_namespace(kwargs['namespace']))
+            with INDEX_SECONDS.time(operation=op, namespace=kwargs.get('namespace', '')):
+                result = await self.index_limiter.run(
+                    lambda: asyncio.to_thread(getattr(self.index, op), **call_kwargs)
+                )
+            if is_write:
+                self._update_lexical_index(op, kwargs)
+                self._update_index_stats(op, kwargs)
+                self._update_chunk_manifest(op, kwargs)
+                self._update_sidecar(op, kwargs)
+                self._update_concept_pools(op, kwargs)
+            return result
+        finally:
+            if is_write:
+                self._bump_namespace_generation(kwargs.get('namespace', ''))
+
+    def add_write_mirror(self, migration):
+        """Start mirroring writes to a migration, through its mirror(op, kwargs)."""
+        if migration not in self._write_mirrors:
+            self._write_mirrors.append(migration)
+
+    def remove_write_mirror(self, migration):
+        """Stop mirroring writes to a migration."""
+        if migration in self._write_mirrors:
+            self._write_mirrors.remove(migration)
+
+    @contextlib.asynccontextmanager
+    async def hold_writes(self):
+        """Hold new writes back and wait for those in flight; the holder itself writes through _index_op."""
+        loop = asyncio.get_running_loop()
+        while self._write_barrier is not None:
+            await asyncio.shield(self._write_barrier)
+        self._write_barrier = loop.create_future()
+        try:
+            if self._writes_in_flight:
+                self._writes_drained = loop.create_future()
+                await self._writes_drained
+            yield
+        finally:
+            barrier = self._write_barrier
+            self._write_barrier = self._writes_drained = None
+            barrier.set_result(None)
+
+    def resolve_namespace(self, namespace: str) -> str:
+        """The physical namespace currently serving a logical one."""
+        return self.namespace_aliases.get(namespace, namespace)
+
+    def _read_namespace_routing(self) -> Dict:
+        """The routing persisted by switch_index, or {} if there is none."""
+        if not self.routing_path.exists():
+            return {}
+        try:
+            return json.loads(self.routing_path.read_text())
+        except Exception as e:
+            logger.error(f"Error loading namespace routing from {self.routing_path}: {e}")
+            return {}
+
+    def _load_namespace_routing(self, routing: Dict):
+        """Apply a completed migration's aliases and dimensions if they were recorded for the store in use."""
+        if not routing:
+            return
+        try:
+            recorded = routing.get('store')
+            if recorded and recorded != self.index.location():
+                logger.error(
+                    f"Ignoring namespace routing from {self.routing_path}: it was recorded for "
+                    f"{recorded}, not the store in use ({self.index.location()})"
+                )
+                return
+            self.namespace_aliases = routing.get('namespace_aliases', {})
+            dimensions = routing.get('embedding_dimensions')
+            if dimensions and dimensions != self.embedding_dimensions:
+                logger.warning(
+                    f"Using {dimensions} embedding dimensions from {self.routing_path} "
+                    f"instead of the configured {self.embedding_dimensions}"
+                )
+                self.embedding_dimensions = dimensions
+        except Exception as e:
+            logger.error(f"Error loading namespace routing from {self.routing_path}: {e}")
+
+    def switch_index(
+        self,
+        store: Optional[VectorStore] = None,
+        namespace_aliases: Optional[Dict[str, str]] = None,
+        dimensions: Optional[int] = None
+    ):
+        """Atomically point reads and writes at a new store, namespaces and embedding size, and persist the routing."""
+        if store is not None and store.location() is None:
+            raise ValueError(f"Can't switch to {type(store).__name__}: it has no location to reopen it from")
+        if store is not None:
+            self.index = store
+            self.index_limiter = get_store_limiter(store)
+            # Aliases into the old store mean nothing in the new one
+            self.namespace_aliases = {}
+        if namespace_aliases:
+            self.namespace_aliases = {**self.namespace_aliases, **namespace_aliases}
+        if dimensions:
+            self.embedding_dimensions = dimensions
+        
+        self._index_epoch += 1
+        self._search_cache.clear()
+        self._vector_cache.clear()
+        for build in self._lexical_builds.values():
+            build.cancel()
+        self._lexical_builds.clear()
+        self._lexical_indexes.clear()
+        for pool in self._concept_pools.values():
+            pool.matches.clear()
+            pool.served.clear()
+        self.index_stats.invalidate()
+        
+        try:
+            self.routing_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.routing_path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps({
+                'store': self.index.location(),
+                'embedding_dimensions': self.embedding_dimensions,
+                'namespace_aliases': self.namespace_aliases
+            }, indent=2))
+            tmp_path.replace(self.routing_path)
+        except Exception as e:
+            logger.error(f"Error saving namespace routing to {self.routing_path}: {e}")
+        
+        logger.info(
+            f"Switched index: {self.embedding_dimensions} dimensions, aliases {self.namespace_aliases}"
+        )
+
+    def _bump_namespace_generation(self, namespace: str):
+        """Mark every cached search result that covers namespace as stale."""
+        self._namespace_generations[namespace] = self._namespace_generations.get(namespace, 0) + 1
+
+    def _invalidate_vectors(self, op: str, kwargs: Dict):
+        """Drop cached vectors that a write operation is about to change."""
+        namespace = kwargs.get('namespace', '')
+        if op == "update":
+            self._vector_cache.pop((namespace, kwargs['id']))
+        elif op == "upsert":
+            for vector in kwargs.get('vectors', []):
+                self._vector_cache.pop((namespace, to_vector(vector).id))
+        elif kwargs.get('ids') and not kwargs.get('deleteAll') and not kwargs.get('filter'):
+            for vector_id in kwargs['ids']:
+                self._vector_cache.pop((namespace, vector_id))
+        else:
+            self._vector_cache.pop_where(lambda key: key[0] == namespace)
+
+    def _update_index_stats(self, op: str, kwargs: Dict):
+        """Adjust cached namespace counts for a completed write until the next refresh."""
+        namespace = self.resolve_namespace(kwargs.get('namespace', ''))
+        if op == "upsert":
+            # Overwrites are counted as new; the next refresh corrects that
+            self.index_stats.adjust(namespace, len(kwargs.get('vectors', [])))
+        elif op == "delete":
+            if kwargs.get('deleteAll'):
+                self.index_stats.reset(namespace)
+            elif kwargs.get('filter'):
+                self.index_stats.invalidate()
+            elif kwargs.get('ids'):
+                self.index_stats.adjust(namespace, -len(kwargs['ids']))
+
+    def _update_chunk_manifest(self, op: str, kwargs: Dict):
+        """Forget manifest entries for chunks a completed delete removed."""
+        if op != "delete":
+            return
+        namespace = kwargs.get('namespace', '')
+        if kwargs.get('ids') and not kwargs.get('deleteAll') and not kwargs.get('filter'):
+            self.chunk_manifest.forget(namespace, kwargs['ids'])
+        else:
+            # Which chunks a filtered delete hit is unknown; re-ingest will re-check them
+            self.chunk_manifest.clear(namespace)
+
+    def _update_concept_pools(self, op: str, kwargs: Dict):
+        """Drop deleted vectors from the namespace's concept pool so they aren't served."""
+        pool = self._concept_pools.get(kwargs.get('namespace', ''))
+        if op != "delete" or pool is None:
+            return
+        if kwargs.get('deleteAll'):
+            pool.matches.clear()
+            pool.served.clear()
+            return
+        if kwargs.get('filter'):
+            deleted = {m.id for m in pool.matches if matches_filter(m.metadata or {}, kwargs['filter'])}
+        else:
+            deleted = set(kwargs.get('ids') or [])
+        pool.matches[:] = [m for m in pool.matches if m.id not in deleted]
+        pool.served -= deleted
+
+    def _update_sidecar(self, op: str, kwargs: Dict):
+        """Drop sidecar records of vectors a completed delete removed."""
+        if op != "delete":
+            return
+        namespace = kwargs.get('namespace', '')
+        if kwargs.get('deleteAll'):
+            self.sidecar.clear(namespace)
+        elif kwargs.get('ids') and not kwargs.get('filter'):
+            self.sidecar.delete(namespace, kwargs['ids'])
+        # Records left behind by a filtered delete are never read again
+
+    def _hydrate(self, namespace: str, items: List[Tuple[str, Dict]]) -> List[Dict]:
+        """Full metadata, including 'text', for (vector ID, index metadata) pairs; index fields win over the sidecar."""
+        records = self.sidecar.get(namespace, [vector_id for vector_id, _ in items])
+        hydrated = []
+        for vector_id, metadata in items:
+            record = records.get(vector_id)
+            if record is None:
+                hydrated.append(metadata)
+                continue
+            full = dict(record['metadata'])
+            full.update(metadata)
+            full['text'] = record['text']
+            hydrated.append(full)
+        return hydrated
+
+    def _update_lexical_index(self, op: str, kwargs: Dict):
+        """Apply a completed write to the namespace's BM25 index, or queue it while the index is being built."""
+        namespace = kwargs.get('namespace', '')
+        index = self._lexical_indexes.get(namespace)
+        if index is not None:
+            self._apply_lexical_write(index, op, kwargs)
+        elif namespace in self._lexical_pending:
+            self._lexical_pending[namespace].append((op, kwargs))
+
+    @staticmethod
+    def _apply_lexical_write(index: BM25Index, op: str, kwargs: Dict):
+        if op == "upsert":
+            for vector in kwargs.get('vectors', []):
+                vector = to_vector(vector)
+                index.add(vector.id, vector.metadata.get('text', ''), vector.metadata)
+        elif op == "index_text":
+            for vector, text in kwargs['chunks']:
+                index.add(vector['id'], text, vector['metadata'])
+        elif op == "update":
+            if kwargs.get('set_metadata'):
+                index.update_metadata(kwargs['id'], kwargs['set_metadata'])
+        elif kwargs.get('deleteAll'):
+            index.clear()
+        elif kwargs.get('filter'):
+            # The index keeps the same metadata the store filters on
+            index.remove_matching(kwargs['filter'])
+        elif kwargs.get('ids'):
+            for vector_id in kwargs['ids']:
+                index.remove(vector_id)
+
+    async def build_lexical_index(self, namespace: str) -> BM25Index:
+        """Build the BM25 index for a namespace from its stored text and titles."""
+        index = BM25Index()
+        pending: List[Tuple[str, Dict]] = []
+        self._lexical_pending[namespace] = pending
+        try:
+            async for batch in self.iter_documents(namespace):
+                for doc in batch.documents:
+                    index.add(doc['id'], doc['text'], doc['metadata'])
+            # The export may have missed writes made while it ran; replay them in order
+            for op, kwargs in pending:
+                self._apply_lexical_write(index, op, kwargs)
+        finally:
+            if self._lexical_pending.get(namespace) is pending:
+                del self._lexical_pending[namespace]
+        self._lexical_indexes[namespace] = index
+        logger.info(f"Built lexical index for {namespace}: {len(index)} documents")
+        return index
+
+    async def _get_lexical_index(self, namespace: str, timeout: float) -> Optional[BM25Index]:
+        """Return the namespace's BM25 index, building it in the background if needed."""
+        index = self._lexical_indexes.get(namespace)
+        if index is not None:
+            return index
+        
+        build = self._lexical_builds.get(namespace)
+        if build is None:
+            build = asyncio.ensure_future(self.build_lexical_index(namespace))
+            self._lexical_builds[namespace] = build
+            
+            def finished(task, namespace=namespace):
+                if self._lexical_builds.get(namespace) is task:
+                    del self._lexical_builds[namespace]
+                if not task.cancelled() and task.exception():
+                    logger.error(f"Error building lexical index for {namespace}: {task.exception()}")
+            
+            build.add_done_callback(finished)
+        
+        try:
+            # Shield the build so a slow search doesn't abandon it
+            return await asyncio.wait_for(asyncio.shield(build), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Lexical index for {namespace} not ready after {timeout}s")
+        except asyncio.CancelledError:
+            if not build.cancelled():
+                raise
+        except Exception:
+            pass  # Logged by the done callback
+        return None
+
+    async def fetch_vectors(self, ids: List[str], namespace: str) -> Dict[str, Vector]:
+        """Fetch vectors and metadata by ID, serving repeats from the vector cache."""
+        vectors = {}
+        missing = []
+        for vector_id in ids:
+            cached = self._vector_cache.get((namespace, vector_id))
+            if cached is not None:
+                vectors[vector_id] = cached
+            else:
+                missing.append(vector_id)
+        
+        if missing:
+            response = await self.index_op("fetch", ids=missing, namespace=namespace)
+            for vector_id, vector in response.vectors.items():
+                cached = Vector(vector_id, list(vector.values), dict(vector.metadata or {}))
+                self._vector_cache.set((namespace, vector_id), cached)
+                vectors[vector_id] = cached
+        
+        return vectors
+
     async def get_embedding(self, text: str) -> List[float]:
-        """Generate embedding for text using OpenAI."""
+        """Generate embedding for text using OpenAI, served from cache when possible."""
         try:
-            logger.info("Attempting to generate embedding with OpenAI...")
-            response = self.openai.embeddings.create(
-                model="text-embedding-3-small",
-                input=text
-            )
-            # Return the embedding values directly, don't make it awaitable
-            return response.data[0].embedding
+            embeddings = await self.get_embeddings([text])
+            return embeddings[0]
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
             return None
 
+    async def get_embeddings(
+        self,
+        texts: List[str],
+        dimensions: Optional[int] = None
+    ) -> List[Optional[List[float]]]:
+        """Generate embeddings for many texts using as few OpenAI requests as possible."""
+        dimensions = dimensions or self.embedding_dimensions
+        cache_model = self._embedding_cache_model(dimensions)
+        request_options = {}
+        if dimensions != self.NATIVE_EMBEDDING_DIMENSIONS:
+            request_options['dimensions'] = dimensions
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        
+        # Serve what we can from cache and group the rest by unique text
+        pending: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            cached = self.embedding_cache.get(cache_model, text)
+            if cached is not None:
+                embeddings[i] = cached
+            else:
+                pending.setdefault(text, []).append(i)
+        
+        EMBEDDING_TEXTS.inc(len(texts) - sum(len(indexes) for indexes in pending.values()), source="cache")
+        EMBEDDING_TEXTS.inc(len(pending), source="api")
+        if not pending:
+            return embeddings
+        
+        async def embed_batch(batch: List[str]):
+            try:
+                async with self._embedding_semaphore:
+                    logger.info(f"Generating {len(batch)} embeddings with OpenAI in one request...")
+                    with EMBEDDING_SECONDS.time():
+                        response = await self.embedding_limiter.run(
+                            lambda: self.openai.embeddings.create(
+                                model=self.embedding_model,
+                                input=batch,
+                                **request_options
+                            ),
+                            tokens=sum(self._count_tokens(text) for text in batch)
+                        )
+                for item in response.data:
+                    text = batch[item.index]
+                    self.embedding_cache.set(cache_model, text, item.embedding)
+                    for i in pending[text]:
+                        embeddings[i] = item.embedding
+            except Exception as e:
+                logger.error(f"Error generating embedding batch of {len(batch)} texts: {e}")
+        
+        await asyncio.gather(*(embed_batch(batch) for batch in self._embedding_batches(list(pending))))
+        
+        return embeddings
+
+    def _embedding_cache_model(self, dimensions: int) -> str:
+        """Cache namespace for embeddings of a given size; full-size ones keep the bare model name."""
+        if dimensions == self.NATIVE_EMBEDDING_DIMENSIONS:
+            return self.embedding_model
+        return f"{self.embedding_model}@{dimensions}"
+
+    def _count_tokens(self, text: str) -> int:
+        """Count tokens the way the embedding model will."""
+        return self.chunker.count_tokens(text)
+
+    def _embedding_batches(self, texts: List[str]):
+        """Group texts into batches that respect embeddings request limits."""
+        batch = []
+        batch_tokens = 0
+        for text in texts:
+            tokens = self._count_tokens(text)
+            if batch and (
+                len(batch) >= self.MAX_EMBEDDING_INPUTS
+                or batch_tokens + tokens > self.MAX_EMBEDDING_BATCH_TOKENS
+            ):
+                yield batch
+                batch = []
+                batch_tokens = 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    async def aclose(self):
+        """Stop background work and flush the embedding cache; clients.aclose_all() closes the connection pools."""
+        await self.index_stats.aclose()
+        self.chunk_manifest.close()
+        self.sidecar.close()
+        self.embedding_cache.close()
+
+    def get_search_cache_stats(self) -> Dict:
+        """Return search cache hit rates, counting invalidated entries as misses."""
+        stats = self._search_cache.stats()
+        stats['invalidated'] = self._search_cache_stale
+        stats['hits'] -= self._search_cache_stale
+        stats['misses'] += self._search_cache_stale
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else None
+        return stats
+
+    def get_embedding_cache_stats(self) -> Dict:
+        """Return embedding cache hit/miss counters."""
+        return self.embedding_cache.stats()
+
+    def _iter_chunks(self, text: str, max_tokens: Optional[int] = None, overlap_tokens: Optional[int] = None):
+        """Lazily split text into token-bounded chunks."""
+        chunker = self.chunker
+        if max_tokens is not None or overlap_tokens is not None:
+            chunker = TextChunker(
+                max_tokens=max_tokens or self.chunker.max_tokens,
+                overlap_tokens=self.chunker.overlap_tokens if overlap_tokens is None else overlap_tokens
+            )
+        return chunker.iter_chunks(text)
+
     def _chunk_text(self, text: str, max_tokens: int = 8000) -> List[str]:
         """Split text into chunks that fit within token limits."""
-        # Rough estimate: 1 token ≈ 4 characters
-        max_chars = max_tokens * 4
-        
-        if len(text) <= max_chars:
-            return [text]
+        return list(self._iter_chunks(text, max_tokens=max_tokens))
+
+    def _build_chunk_metadata(
+        self,
+        doc_id: str,
+        chunk_index: int,
+        total_chunks: int,
+        metadata: Optional[Dict],
+        namespace: str
+    ) -> Dict:
+        """Build the slim index metadata for a single chunk; everything else goes to the sidecar."""
+        now = datetime.now()
+        return {
+            'chunk_index': chunk_index,
+            'total_chunks': total_chunks,
+            'timestamp': now.isoformat(),
+            # Numeric copy of the timestamp for range filters
+            'created_at': int(now.timestamp()),
+            'category': metadata.get('category', '') if metadata else '',
+            'tags': metadata.get('tags', []) if metadata else [],
+            'title': metadata.get('title', '') if metadata else '',
+            'id': doc_id
+        }
+
+    async def _upsert_vectors(self, vectors: List[Dict], namespace: str) -> set:
+        """Upsert vectors in batches, returning the IDs that were written."""
+        written = set()
+        for i in range(0, len(vectors), self.UPSERT_BATCH_SIZE):
+            batch = vectors[i:i + self.UPSERT_BATCH_SIZE]
+            try:
+                await self.index_op("upsert", vectors=batch, namespace=namespace)
+                written.update(v['id'] for v in batch)
+            except Exception as e:
+                logger.error(f"Error upserting batch of {len(batch)} vectors to {namespace}: {e}")
+        return written
+
+    def _index_chunk_text(self, namespace: str, chunks: List[Tuple[Dict, str]]):
+        """Add written (vector, chunk text) pairs to the namespace's BM25 index."""
+        self._update_lexical_index("index_text", {'namespace': namespace, 'chunks': chunks})
+
+    @staticmethod
+    def _document_id(text: str, metadata: Optional[Dict]) -> str:
+        """The caller's document ID, else one derived from its source or title so edits keep it, else from the content."""
+        metadata = metadata or {}
+        if metadata.get('id'):
+            return metadata['id']
+        for key in ('source', 'title'):
+            if metadata.get(key):
+                return hashlib.sha256(f"{key}\x00{metadata[key]}".encode("utf-8")).hexdigest()[:32]
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+    def _iter_plans(
+        self,
+        doc_id: str,
+        text: str,
+        metadata: Optional[Dict],
+        namespace: str
+    ) -> Iterator[ChunkPlan]:
+        """Plan a document chunk_window_size chunks at a time, as the chunker produces them."""
+        document = DocumentPlan(doc_id=doc_id, previous=self.chunk_manifest.get(namespace, doc_id))
+        total = sum(1 for _ in self._iter_chunks(text))
+        window: List[str] = []
+        start = 0
+        for chunk in self._iter_chunks(text):
+            window.append(chunk)
+            if len(window) >= self.chunk_window_size:
+                yield self._plan_chunks(document, window, start, total, metadata, namespace)
+                start += len(window)
+                window = []
+        # A document with no chunks still gets a window, so its old chunks are dropped
+        if window or not total:
+            yield self._plan_chunks(document, window, start, total, metadata, namespace)
+
+    def _plan_chunks(
+        self,
+        document: DocumentPlan,
+        chunks: List[str],
+        start: int,
+        total: int,
+        metadata: Optional[Dict],
+        namespace: str
+    ) -> ChunkPlan:
+        """Derive content-hashed chunk IDs for a window and compare them with the manifest."""
+        doc_id = document.doc_id
+        chunk_ids, chunk_metadata, fingerprints, metadata_fingerprints = [], [], [], []
+        seen = document.seen
+        model = self._embedding_cache_model(self.embedding_dimensions)
+        for i, chunk in enumerate(chunks, start=start):
+            digest = hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:16]
+            # Repeated chunks within a document still need distinct IDs
+            seen[digest] = seen.get(digest, 0) + 1
+            if seen[digest] > 1:
+                digest = hashlib.sha256(f"{chunk}\x00{seen[digest]}".encode("utf-8")).hexdigest()[:16]
+            chunk_ids.append(f"{doc_id}-{digest}")
             
-        chunks = []
-        current_chunk = ""
+            built = self._build_chunk_metadata(doc_id, i, total, metadata, namespace)
+            chunk_metadata.append(built)
+            fingerprints.append(hashlib.sha256(
+                json.dumps([model, chunk]).encode("utf-8")
+            ).hexdigest())
+            metadata_fingerprints.append(hashlib.sha256(
+                json.dumps(self._stable_metadata(built), sort_keys=True, default=str).encode("utf-8")
+            ).hexdigest())
         
-        # Split by paragraphs first
-        paragraphs = text.split('\n\n')
+        pending, relabel = [], []
+        for i, chunk_id in enumerate(chunk_ids):
+            fingerprint, metadata_fingerprint = document.previous.get(chunk_id, (None, None))
+            if fingerprint != fingerprints[i]:
+                pending.append(i)
+            elif metadata_fingerprint != metadata_fingerprints[i]:
+                relabel.append(i)
         
-        for paragraph in paragraphs:
-            if len(current_chunk) + len(paragraph) + 2 <= max_chars:
-                current_chunk += paragraph + '\n\n'
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = paragraph + '\n\n'
-                
-        if current_chunk:
-            chunks.append(current_chunk.strip())
-            
-        return chunks
+        document.chunk_ids.extend(chunk_ids)
+        document.changed += len(pending) + len(relabel)
+        document.windows += 1
+        document.planned = start + len(chunks) >= total
+        return ChunkPlan(
+            doc_id=doc_id,
+            chunks=chunks,
+            chunk_ids=chunk_ids,
+            metadata=chunk_metadata,
+            fingerprints=fingerprints,
+            metadata_fingerprints=metadata_fingerprints,
+            pending=pending,
+            relabel=relabel,
+            document=document,
+            start=start,
+            full_metadata={key: value for key, value in (metadata or {}).items() if key != 'text'}
+        )
 
-    def _summarize_analysis(self, analysis: Dict) -> Dict:
-        """Summarize analysis data to fit within metadata size limits."""
-        try:
-            # Create a condensed version of the analysis
-            summary = {
-                'core_concepts': [],
-                'narratives': [],
-                'unique_elements': [],
-                'implications': '',
-                'key_quotes': []
-            }
-            
-            # Process core concepts - keep only top 2, limit to 50 chars each
-            if 'core_concepts' in analysis:
-                concepts = analysis['core_concepts']
-                summary['core_concepts'] = [c[:50] for c in concepts[:2]]
-            
-            # Process narratives - keep only top 1, limit to 75 chars
-            if 'narratives' in analysis:
-                narratives = analysis['narratives']
-                summary['narratives'] = [n[:75] for n in narratives[:1]]
-            
-            # Process unique elements - keep only top 2, limit to 50 chars each
-            if 'unique_elements' in analysis:
-                elements = analysis['unique_elements']
-                summary['unique_elements'] = [e[:50] for e in elements[:2]]
-            
-            # Process implications - summarize to key points, limit to 100 chars
-            if 'implications' in analysis:
-                implications = analysis['implications']
-                summary['implications'] = implications[:100] + ('...' if len(implications) > 100 else '')
-            
-            # Process key quotes - keep only top 1, limit to 75 chars
-            if 'key_quotes' in analysis:
-                quotes = analysis['key_quotes']
-                summary['key_quotes'] = [q[:75] for q in quotes[:1]]
-            
-            # Verify total size is under 40KB
-            summary_json = json.dumps(summary)
-            if len(summary_json.encode('utf-8')) > 40000:  # 40KB limit
-                logger.warning("Summary still too large, applying additional compression")
-                # Further reduce sizes if needed
-                for key in summary:
-                    if isinstance(summary[key], list):
-                        summary[key] = summary[key][:1]  # Keep only first item
-                    elif isinstance(summary[key], str):
-                        summary[key] = summary[key][:50]  # Limit to 50 chars
-            
-            return summary
-            
-        except Exception as e:
-            logger.error(f"Error summarizing analysis: {e}")
-            return {}
+    @staticmethod
+    def _stable_metadata(metadata: Dict) -> Dict:
+        """Chunk metadata without the write times, which change on every write."""
+        return {key: value for key, value in metadata.items() if key not in ('timestamp', 'created_at')}
+
+    def _record_chunks(self, plan: ChunkPlan, namespace: str):
+        """Store the full text and metadata of a plan's new and relabeled chunks ahead of their writes."""
+        self.sidecar.put(namespace, {
+            plan.chunk_ids[i]: (plan.chunks[i], dict(plan.full_metadata, **plan.metadata[i]))
+            for i in plan.pending + plan.relabel
+        })
+
+    def _plan_vectors(self, plan: ChunkPlan, embeddings: List[Optional[List[float]]]) -> List[Dict]:
+        """Vectors for a plan's pending chunks, given their embeddings in the same order."""
+        vectors = []
+        for i, embedding in zip(plan.pending, embeddings):
+            if not embedding:
+                logger.error(f"Failed to generate embedding for chunk {i} of {plan.doc_id}")
+                continue
+            vectors.append({
+                'id': plan.chunk_ids[i],
+                'values': embedding,
+                'metadata': plan.metadata[i]
+            })
+        return vectors
+
+    async def _relabel_chunks(self, plan: ChunkPlan, namespace: str, max_concurrency: int = 8) -> set:
+        """Send metadata-only updates for a plan's relabeled chunks, returning the IDs updated."""
+        semaphore = asyncio.Semaphore(max_concurrency)
+        updated = set()
+        
+        async def relabel(i: int):
+            try:
+                async with semaphore:
+                    # Keep the original write time of content that didn't change
+                    await self.index_op(
+                        "update",
+                        id=plan.chunk_ids[i],
+                        set_metadata=self._stable_metadata(plan.metadata[i]),
+                        namespace=namespace
+                    )
+                updated.add(plan.chunk_ids[i])
+            except Exception as e:
+                logger.error(f"Error updating metadata of chunk {i} of {plan.doc_id}: {e}")
+        
+        await asyncio.gather(*(relabel(i) for i in plan.relabel))
+        return updated
+
+    async def _finish_plan(self, plan: ChunkPlan, namespace: str, written: set) -> List[bool]:
+        """Relabel a window's moved chunks and record what is stored, returning per-chunk success."""
+        written = written | await self._relabel_chunks(plan, namespace)
+        document = plan.document
+        changed = set(plan.pending) | set(plan.relabel)
+        success = [i not in changed or plan.chunk_ids[i] in written for i in range(len(plan.chunks))]
+        for i, chunk_id in enumerate(plan.chunk_ids):
+            if success[i]:
+                document.stored[chunk_id] = (plan.fingerprints[i], plan.metadata_fingerprints[i])
+            elif chunk_id in document.previous:
+                # Still stored under its old metadata; the next ingest retries it
+                document.stored[chunk_id] = document.previous[chunk_id]
+        document.failed += success.count(False)
+        document.finished_windows += 1
+        if document.complete:
+            await self._finish_document(document, namespace)
+        return success
+
+    async def _finish_document(self, document: DocumentPlan, namespace: str):
+        """Record what is now stored for a document and drop its old chunks if the rest are all in."""
+        stale_ids = document.stale_ids
+        stored = dict(document.stored)
+        keep_stale = bool(stale_ids)
+        if stale_ids and not document.failed:
+            try:
+                for start in range(0, len(stale_ids), self.UPSERT_BATCH_SIZE):
+                    await self.index_op(
+                        "delete",
+                        ids=stale_ids[start:start + self.UPSERT_BATCH_SIZE],
+                        namespace=namespace
+                    )
+                keep_stale = False
+            except Exception as e:
+                logger.error(f"Error deleting old chunks of {document.doc_id}: {e}")
+        if keep_stale:
+            # Keep old chunks in the manifest so the next ingest retries removing them
+            stored.update({chunk_id: document.previous[chunk_id] for chunk_id in stale_ids})
+        
+        self.chunk_manifest.record(namespace, document.doc_id, stored)
+
+    def plan_document(
+        self,
+        doc_id: str,
+        text: str,
+        metadata: Optional[Dict],
+        namespace: str
+    ) -> Iterator[ChunkPlan]:
+        """Chunk a document and work out, a window at a time, which chunks need embedding or relabeling."""
+        return self._iter_plans(doc_id, text, metadata, namespace)
+
+    async def embed_plans(self, plans: List[ChunkPlan]) -> List[List[Dict]]:
+        """Embed every pending chunk of the plans in as few requests as possible, returning each plan's vectors."""
+        texts = [plan.chunks[i] for plan in plans for i in plan.pending]
+        embeddings = await self.get_embeddings(texts) if texts else []
+        vectors, position = [], 0
+        for plan in plans:
+            vectors.append(self._plan_vectors(plan, embeddings[position:position + len(plan.pending)]))
+            position += len(plan.pending)
+        return vectors
+
+    async def store_plans(self, plans: List[ChunkPlan], vectors: List[List[Dict]], namespace: str) -> List[List[bool]]:
+        """Write embedded plans to the sidecar, index and lexical index, returning per-chunk success for each."""
+        for plan in plans:
+            self._record_chunks(plan, namespace)
+        written = await self._upsert_vectors([vector for batch in vectors for vector in batch], namespace)
+        
+        success = []
+        for plan, batch in zip(plans, vectors):
+            success.append(await self._finish_plan(plan, namespace, written))
+            self._index_chunk_text(namespace, [
+                (vector, plan.chunks[vector['metadata']['chunk_index'] - plan.start])
+                for vector in batch if vector['id'] in written
+            ])
+        return success
 
     async def add_document(
         self,
         text: str,
         metadata: Optional[Dict] = None,
         namespace: str = "default"
-    ) -> bool:
-        """Add a document to the knowledge base."""
+    ) -> AddDocumentResult:
+        """Add a document, embedding only the chunks the manifest doesn't have, and report success per chunk."""
+        doc_id = self._document_id(text, metadata)
+        result = AddDocumentResult(doc_id=doc_id)
         try:
-            # Chunk the text if it's too long
-            chunks = self._chunk_text(text)
-            
-            for i, chunk in enumerate(chunks):
-                # Create base metadata with essential fields
-                chunk_metadata = {
-                    'chunk_index': i,
-                    'total_chunks': len(chunks),
-                    'timestamp': datetime.now().isoformat(),
-                    'category': metadata.get('category', '') if metadata else '',
-                    'tags': metadata.get('tags', []) if metadata else [],
-                    'title': metadata.get('title', '') if metadata else '',
-                    'id': metadata.get('id', str(uuid.uuid4())) if metadata else str(uuid.uuid4())
-                }
-                
-                # For backrooms namespace, include summarized analysis data
-                if namespace == 'backrooms' and metadata and 'full_analysis' in metadata:
-                    analysis = metadata['full_analysis']
-                    summarized_analysis = self._summarize_analysis(analysis)
-                    chunk_metadata.update(summarized_analysis)
-                
-                # Generate embedding for this chunk
-                embedding = await self.get_embedding(chunk)
-                if not embedding:
-                    logger.error(f"Failed to generate embedding for chunk {i}")
-                    continue
-                    
-                # Store in Pinecone
-                self.index.upsert(
-                    vectors=[{
-                        'id': f"{chunk_metadata['id']}-{i}",
-                        'values': embedding,
-                        'metadata': chunk_metadata
-                    }],
-                    namespace=namespace
-                )
-                
-            return True
+            # One write slot for the whole document, so a migration's switch
+            # can't land between embedding a chunk and storing it
+            async with self._write_slot():
+                await self._add_plans(doc_id, text, metadata, namespace, result)
+            
+            if result.failed_chunks:
+                logger.warning(f"Document {doc_id}: {len(result.failed_chunks)}/{len(result.chunk_ids)} chunks failed")
+            return result
             
         except Exception as e:
             logger.error(f"Error adding document: {e}")
-            return False
+            result.chunk_success += [False] * (len(result.chunk_ids) - len(result.chunk_success))
+            return result
+
+    async def _add_plans(
+        self,
+        doc_id: str,
+        text: str,
+        metadata: Optional[Dict],
+        namespace: str,
+        result: AddDocumentResult
+    ):
+        """Embed and store a document window by window, recording the outcome in result."""
+        for plan in self.plan_document(doc_id, text, metadata, namespace):
+            result.chunk_ids = plan.document.chunk_ids
+            result.relabeled_chunks += len(plan.relabel)
+            result.unchanged_chunks += len(plan.chunks) - len(plan.pending) - len(plan.relabel)
+            vectors = await self.embed_plans([plan])
+            result.chunk_success += (await self.store_plans([plan], vectors, namespace))[0]
+
+    def _format_search_result(self, result, namespace: str) -> Dict:
+        """Shape a query match into the search result format."""
+        # Process backrooms results differently
+        if namespace == 'backrooms':
+            # Full analyses come from the sidecar; older vectors carry a summary inline
+            analysis = result.metadata.get('full_analysis') or result.metadata
+            return {
+                'text': result.metadata.get('text', ''),
+                'metadata': {
+                    'core_concepts': analysis.get('core_concepts', []),
+                    'narratives': analysis.get('narratives', []),
+                    'technical_insights': analysis.get('technical_insights', []),
+                    'key_quotes': analysis.get('key_quotes', []),
+                    'unique_elements': analysis.get('unique_elements', []),
+                    'implications': analysis.get('implications', '')
+                },
+                'score': result.score,
+                'namespace': namespace
+            }
+        return {
+            'text': result.metadata.get('text', ''),
+            'metadata': result.metadata,
+            'score': result.score,
+            'namespace': namespace
+        }
+
+    async def _search_namespace(
+        self,
+        vector: Optional[List[float]],
+        namespace: str,
+        timeout: float,
+        query: str = "",
+        mode: str = "vector",
+        top_k: int = 1,
+        filter: Optional[Dict] = None,
+        fields: Optional[List[str]] = None
+    ) -> Tuple[bool, List[Dict]]:
+        """Find the best top_k matches in a single namespace, returning whether every retriever answered."""
+        candidates = top_k if mode == "vector" else max(top_k, self.HYBRID_CANDIDATES)
+        completed = True
+        
+        vector_matches = []
+        if vector is not None:
+            try:
+                response = await asyncio.wait_for(
+                    self.index_op(
+                        "query",
+                        vector=vector,
+                        namespace=namespace,
+                        top_k=candidates,
+                        include_metadata=True,
+                        filter=filter,
+                        fields=fields
+                    ),
+                    timeout=timeout
+                )
+                vector_matches = response.matches
+            except asyncio.TimeoutError:
+                logger.warning(f"Search in {namespace} timed out after {timeout}s")
+                completed = False
+            except Exception as e:
+                logger.error(f"Error searching {namespace}: {e}")
+                completed = False
+        
+        if mode == "vector":
+            if not completed:
+                return False, []
+            matches = vector_matches[:top_k]
+        else:
+            lexical = await self._get_lexical_index(namespace, timeout)
+            if lexical is None:
+                completed = False
+                lexical_hits = []
+            else:
+                lexical_hits = lexical.search(query, top_k=candidates, filter=filter)
+            
+            fused = reciprocal_rank_fusion([
+                [match.id for match in vector_matches],
+                [doc_id for doc_id, _ in lexical_hits]
+            ])
+            vector_metadata = {match.id: match.metadata for match in vector_matches}
+            matches = []
+            for doc_id, score in fused[:top_k]:
+                metadata = vector_metadata.get(doc_id)
+                if metadata is None:
+                    metadata = project_metadata(lexical.get_metadata(doc_id), fields)
+                matches.append(Match(doc_id, score, metadata=metadata))
+        
+        if not matches:
+            logger.info(f"No matches found in {namespace}")
+            return completed, []
+        
+        # Only the returned hits are expanded to their full records, and only
+        # when the index didn't already have every requested field
+        items = [(match.id, match.metadata or {}) for match in matches]
+        if fields is None or any(key not in metadata for _, metadata in items for key in fields):
+            items = list(zip([match.id for match in matches], self._hydrate(namespace, items)))
+        matches = [
+            Match(match.id, match.score, metadata=project_metadata(metadata, fields))
+            for match, (_, metadata) in zip(matches, items)
+        ]
+        
+        best = matches[0]
+        logger.info(f"""
+Found {len(matches)} match(es) in {namespace}:
+Score: {best.score}
+Category: {best.metadata.get('category', 'N/A')}
+Unique Elements: {len(best.metadata.get('unique_elements', []))} items
+""")
+        return completed, [self._format_search_result(match, namespace) for match in matches]
 
     async def search(
         self,
         query: str,
         top_k: int = 1,
-        namespaces: List[str] = ["MANA", "knowledge", "backrooms"]
+        namespaces: List[str] = ["MANA", "knowledge", "backrooms"],
+        namespace_timeout: Optional[float] = None,
+        mode: str = "vector",
+        filter: Optional[Dict] = None,
+        fields: Optional[List[str]] = None
     ) -> List[Dict]:
-        """Search across namespaces, getting top result from each."""
+        """Search namespaces concurrently for the top_k results of each, optionally filtered by metadata."""
+        logger.info(f"\n=== Knowledge Base Search ===")
+        logger.info(f"Query: {query[:100]}...")
+        results = await self.search_many([query], top_k, namespaces, namespace_timeout, mode, filter, fields)
+        return results[0]
+
+    async def search_many(
+        self,
+        queries: List[str],
+        top_k: int = 1,
+        namespaces: List[str] = ["MANA", "knowledge", "backrooms"],
+        namespace_timeout: Optional[float] = None,
+        mode: str = "vector",
+        filter: Optional[Dict] = None,
+        fields: Optional[List[str]] = None
+    ) -> List[List[Dict]]:
+        """Run several searches at once, embedding the uncached queries in one request."""
+        results: List[List[Dict]] = [[] for _ in queries]
         try:
-            logger.info(f"\n=== Knowledge Base Search ===")
-            logger.info(f"Query: {query[:100]}...")
+            generations = (self._index_epoch,) + tuple(self._namespace_generations.get(ns, 0) for ns in namespaces)
             
-            vector = await self.get_embedding(query)
-            if not vector:
-                logger.error("Failed to generate search embedding")
-                return []
+            # Serve cached answers and group the rest by normalized query
+            options = (
+                json.dumps(filter, sort_keys=True, default=str) if filter else None,
+                tuple(fields) if fields is not None else None
+            )
+            pending: Dict[Tuple, List[int]] = {}
+            for i, query in enumerate(queries):
+                cache_key = (EmbeddingCache.normalize(query), tuple(namespaces), top_k, mode) + options
+                if cache_key in pending:
+                    pending[cache_key].append(i)
+                    continue
+                cached = self._search_cache.get(cache_key)
+                if cached is not None:
+                    if cached[0] == generations:
+                        logger.info("Serving search results from cache")
+                        results[i] = list(cached[1])
+                        continue
+                    self._search_cache.pop(cache_key)
+                    self._search_cache_stale += 1
+                pending[cache_key] = [i]
             
-            all_results = []
-            for namespace in namespaces:
-                response = self.index.query(
-                    vector=vector,
-                    namespace=namespace,
-                    top_k=1,
-                    include_metadata=True
-                )
-                if response.matches:
-                    result = response.matches[0]
-                    
-                    # Process backrooms results differently
-                    if namespace == 'backrooms':
-                        result_dict = {
-                            'text': result.metadata.get('text', ''),
-                            'metadata': {
-                                'core_concepts': result.metadata.get('full_analysis', {}).get('core_concepts', []),
-                                'narratives': result.metadata.get('full_analysis', {}).get('narratives', []),
-                                'technical_insights': result.metadata.get('full_analysis', {}).get('technical_insights', []),
-                                'key_quotes': result.metadata.get('full_analysis', {}).get('key_quotes', []),
-                                'unique_elements': result.metadata.get('unique_elements', []),
-                                'implications': result.metadata.get('implications', '')
-                            },
-                            'score': result.score,
-                            'namespace': namespace
-                        }
-                    else:
-                        result_dict = {
-                            'text': result.metadata.get('text', ''),
-                            'metadata': result.metadata,
-                            'score': result.score,
-                            'namespace': namespace
-                        }
-                        
-                    all_results.append(result_dict)
-                    logger.info(f"""
-Found match in {namespace}:
-Score: {result.score}
-Category: {result.metadata.get('category', 'N/A')}
-Unique Elements: {len(result.metadata.get('unique_elements', []))} items
-""")
-                else:
-                    logger.info(f"No matches found in {namespace}")
+            if not pending:
+                return results
+            
+            texts = [queries[indexes[0]] for indexes in pending.values()]
+            vectors: List[Optional[List[float]]] = [None] * len(texts)
+            if mode == "vector":
+                vectors = await self.get_embeddings(texts)
+            elif mode == "hybrid":
+                # Let a slow embedding finish in the background (it lands in
+                # the embedding cache) while we answer lexically
+                embedding = asyncio.ensure_future(self.get_embeddings(texts))
+                try:
+                    vectors = await asyncio.wait_for(asyncio.shield(embedding), self.embedding_fallback_timeout)
+                except asyncio.TimeoutError:
+                    logger.warning("Embedding is slow; answering with lexical results only")
             
-            return all_results
+            timeout = namespace_timeout or self.namespace_timeout
+            
+            async def search_one(cache_key: Tuple, text: str, vector: Optional[List[float]]):
+                if mode == "vector" and not vector:
+                    logger.error("Failed to generate search embedding")
+                    return
+                
+                # Query every namespace at once; a slow or failing namespace is
+                # dropped from the results instead of delaying the others
+                outcomes = await asyncio.gather(*(
+                    self._search_namespace(
+                        vector, namespace, timeout,
+                        query=text, mode=mode, top_k=top_k, filter=filter, fields=fields
+                    )
+                    for namespace in namespaces
+                ))
+                found = [result for _, matches in outcomes for result in matches]
+                for i in pending[cache_key]:
+                    results[i] = list(found)
+                
+                # Only cache complete answers, tagged with the generations they
+                # saw; hybrid searches answered without an embedding are partial
+                if vector or mode == "lexical":
+                    if all(completed for completed, _ in outcomes):
+                        self._search_cache.set(cache_key, (generations, found))
+            
+            await asyncio.gather(*(
+                search_one(cache_key, text, vector)
+                for cache_key, text, vector in zip(pending, texts, vectors)
+            ))
+            return results
             
         except Exception as e:
             logger.error(f"Error searching: {e}")
-            return []
+            return results
+
+    async def _sample_concepts(self, namespace: str) -> List:
+        """Query a random direction for a fresh, shuffled sample of concepts."""
+        random_vector = np.random.uniform(-1, 1, self.embedding_dimensions).tolist()
+        response = await self.index_op(
+            "query",
+            vector=random_vector,
+            namespace=namespace,
+            top_k=self.concept_pool_size,
+            include_metadata=True
+        )
+        matches = list(response.matches)
+        random.shuffle(matches)
+        return matches
+
+    def _sample_concepts_blocking(self, namespace: str) -> List:
+        """Run _sample_concepts to completion from synchronous code, even inside a running event loop."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self._sample_concepts(namespace))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self._sample_concepts(namespace)).result()
+
+    def _fill_concept_pool(self, pool: ConceptPool, matches: List):
+        """Add sampled concepts to a pool, skipping ones already pooled or served."""
+        pooled = {m.id for m in pool.matches}
+        fresh = [m for m in matches if m.id not in pooled and m.id not in pool.served]
+        if not fresh and matches and not pool.matches:
+            # Everything in reach has been served; start a new round
+            pool.served.clear()
+            fresh = list(matches)
+        pool.matches.extend(fresh)
+
+    async def _refill_concept_pool(self, namespace: str):
+        """Top up a namespace's concept pool in the background."""
+        pool = self._concept_pools[namespace]
+        try:
+            matches = await self._sample_concepts(namespace)
+            self._fill_concept_pool(pool, matches)
+        except Exception as e:
+            logger.warning(f"Background refill of {namespace} concept pool failed: {e}")
+        finally:
+            pool.refill = None
+
+    def _schedule_concept_pool_refill(self, namespace: str):
+        """Start a background refill if one isn't already running."""
+        pool = self._concept_pools[namespace]
+        if pool.refill is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # No event loop; the pool is refilled inline when it runs dry
+        pool.refill = loop.create_task(self._refill_concept_pool(namespace))
 
     def get_random_concept(self, namespace: str = None) -> Optional[Dict]:
-        """Get a random concept from specified namespace."""
+        """Get a random concept from specified namespace, drawn without repeats from a prefetched pool."""
         try:
             # Use provided namespace or default to self.namespace
             target_namespace = namespace or self.namespace
+            pool = self._concept_pools.setdefault(target_namespace, ConceptPool())
             
-            # Generate random vector for better distribution
-            random_vector = [random.uniform(-1, 1) for _ in range(1536)]
-            
-            response = self.index.query(
-                vector=random_vector,
-                namespace=target_namespace,
-                top_k=50,  # Keep reasonable sample size
-                include_metadata=True
-            )
+            if not pool.matches:
+                self._fill_concept_pool(pool, self._sample_concepts_blocking(target_namespace))
             
-            if not response.matches:
+            if not pool.matches:
                 logger.warning(f"No concepts found for namespace: {target_namespace}")
                 return None
                 
-            # Randomly select one from the results
-            concept = random.choice(response.matches)
+            # Take the next concept from the shuffled pool
+            concept = pool.matches.pop()
+            pool.served.add(concept.id)
+            if len(pool.matches) <= self.concept_pool_low_water:
+                self._schedule_concept_pool_refill(target_namespace)
+            metadata = self._hydrate(target_namespace, [(concept.id, concept.metadata or {})])[0]
             
             # Process backrooms concepts differently
             if target_namespace == 'backrooms':
+                analysis = metadata.get('full_analysis') or metadata
                 result = {
                     'id': concept.id,
-                    'text': concept.metadata.get('text', ''),
-                    'title': concept.metadata.get('title', ''),
+                    'text': metadata.get('text', ''),
+                    'title': metadata.get('title', ''),
                     'namespace': target_namespace,
-                    'core_concepts': concept.metadata.get('full_analysis', {}).get('core_concepts', []),
-                    'key_quotes': concept.metadata.get('full_analysis', {}).get('key_quotes', []),
-                    'unique_elements': concept.metadata.get('unique_elements', []),
-                    'implications': concept.metadata.get('implications', '')
+                    'core_concepts': analysis.get('core_concepts', []),
+                    'key_quotes': analysis.get('key_quotes', []),
+                    'unique_elements': analysis.get('unique_elements', []),
+                    'implications': analysis.get('implications', '')
                 }
             else:
                 result = {
                     'id': concept.id,
-                    'text': concept.metadata.get('text', ''),
-                    'title': concept.metadata.get('title', ''),
-                    'namespace': concept.metadata.get('namespace', '')
+                    'text': metadata.get('text', ''),
+                    'title': metadata.get('title', ''),
+                    'namespace': metadata.get('namespace', '')
                 }
             
             logger.info(f"""
@@ -309,7 +1369,8 @@ Unique Elements: {len(result.get('unique_elements', []))} items
                 return topic
             
             # Query the knowledge namespace
-            response = self.index.query(
+            response = await self.index_op(
+                "query",
                 vector=topic_embedding,
                 namespace=self.namespace,
                 top_k=3,
@@ -318,9 +1379,9 @@ Unique Elements: {len(result.get('unique_elements', []))} items
             
             # Combine the context from related entries
             context = []
-            for match in response.matches:
-                if match.metadata.get("text"):
-                    context.append(match.metadata["text"])
+            for metadata in self._hydrate(self.namespace, [(m.id, m.metadata or {}) for m in response.matches]):
+                if metadata.get("text"):
+                    context.append(metadata["text"])
             
             return " ".join(context) if context else topic
             
@@ -331,9 +1392,8 @@ Unique Elements: {len(result.get('unique_elements', []))} items
     async def get_total_concepts(self) -> int:
         """Get total number of concepts in the knowledge namespace."""
         try:
-            # Get index stats for the knowledge namespace
-            stats = self.index.describe_index_stats()
-            return stats.namespaces.get(self.namespace, {}).get("vector_count", 0)
+            # Served from the cached index stats
+            return await self.index_stats.get_count(self.resolve_namespace(self.namespace))
         except Exception as e:
             logger.error(f"Error getting total concepts: {e}")
             return 0
@@ -342,21 +1402,19 @@ Unique Elements: {len(result.get('unique_elements', []))} items
         """Get expanded context for a concept with metadata."""
         try:
             # Get the original concept first
-            concept_response = self.index.fetch(
-                ids=[concept_id],
-                namespace=self.namespace
-            )
+            concept_vectors = await self.fetch_vectors([concept_id], self.namespace)
             
-            if not concept_response.vectors:
+            if concept_id not in concept_vectors:
                 logger.error(f"Could not find original concept with id {concept_id}")
                 return []
             
             # Get concept vector and metadata
-            concept_vector = concept_response.vectors[concept_id].values
-            concept_metadata = concept_response.vectors[concept_id].metadata
+            concept_vector = concept_vectors[concept_id].values
+            concept_metadata = concept_vectors[concept_id].metadata
             
             # Query similar concepts without strict filtering
-            response = self.index.query(
+            response = await self.index_op(
+                "query",
                 vector=concept_vector,
                 namespace=self.namespace,
                 top_k=top_k + 1,  # Add 1 to account for the original concept
@@ -365,13 +1423,14 @@ Unique Elements: {len(result.get('unique_elements', []))} items
             
             # Return list of contexts with their metadata
             contexts = []
-            for match in response.matches:
+            hydrated = self._hydrate(self.namespace, [(m.id, m.metadata or {}) for m in response.matches])
+            for match, metadata in zip(response.matches, hydrated):
                 # Skip if it's the same as the original concept
                 if match.id == concept_id:
                     continue
                 
                 context = {
-                    "text": match.metadata.get("text", ""),
+                    "text": metadata.get("text", ""),
                     "score": match.score
                 }
                 contexts.append(context)
@@ -383,71 +1442,60 @@ Unique Elements: {len(result.get('unique_elements', []))} items
             logger.error(f"Error getting concept context: {e}")
             return []
 
-    async def get_documents(self, namespace: str) -> List[Dict]:
-        """Get all documents from a namespace."""
-        try:
-            # Get all vector IDs in the namespace
-            stats = self.index.describe_index_stats()
-            namespace_stats = stats.namespaces.get(namespace, {})
-            vector_count = namespace_stats.get("vector_count", 0)
-            
-            if vector_count == 0:
-                logger.warning(f"No vectors found in namespace: {namespace}")
-                return []
-            
-            logger.info(f"Found {vector_count} vectors in namespace {namespace}")
+    async def iter_documents(
+        self,
+        namespace: str,
+        batch_size: int = 100,
+        cursor: Optional[str] = None,
+        include_values: bool = False
+    ) -> AsyncIterator[DocumentBatch]:
+        """Stream every document in a namespace a page at a time, each batch with the cursor to resume after it."""
+        while True:
+            page = await self.index_op(
+                "list_paginated",
+                namespace=namespace,
+                limit=batch_size,
+                pagination_token=cursor
+            )
             
-            # Constants
-            BATCH_SIZE = 1000
-            QUERY_SIZE = 10000  # Increased from 100
-            all_docs = []
-            all_ids = set()  # Use set to avoid duplicates
-            
-            # Do multiple queries with different random vectors until we get close to vector_count
-            attempts = 0
-            max_attempts = 20  # Increased from 2
-            
-            while len(all_ids) < vector_count and attempts < max_attempts:
-                attempts += 1
-                random_vector = np.random.rand(1536).tolist()
-                response = self.index.query(
-                    vector=random_vector,
-                    namespace=namespace,
-                    top_k=QUERY_SIZE,
-                    include_metadata=True
-                )
-                
-                new_ids = [match.id for match in response.matches]
-                prev_count = len(all_ids)
-                all_ids.update(new_ids)
-                new_unique = len(all_ids) - prev_count
-                
-                logger.info(f"Query {attempts}: Retrieved {len(new_ids)} vectors, {new_unique} new unique IDs (Total unique: {len(all_ids)})")
-                
-                # If we're not getting many new IDs, try a few more times then break
-                if new_unique < 10 and len(all_ids) > vector_count * 0.9:
-                    break
-            
-            all_ids = list(all_ids)
-            logger.info(f"Total unique vector IDs retrieved: {len(all_ids)}")
-            
-            # Fetch documents in batches using their IDs
-            for i in range(0, len(all_ids), BATCH_SIZE):
-                batch_ids = all_ids[i:i + BATCH_SIZE]
-                response = self.index.fetch(
-                    ids=batch_ids,
+            documents = []
+            if page.ids:
+                response = await self.index_op(
+                    "fetch",
+                    ids=page.ids,
                     namespace=namespace
                 )
-                
-                for id, vector in response.vectors.items():
+                records = self.sidecar.get(namespace, page.ids)
+                for id in page.ids:
+                    vector = response.vectors.get(id)
+                    if vector is None:
+                        continue  # Deleted between list and fetch
+                    record = records.get(id)
                     doc = {
                         'id': id,
-                        'text': vector.metadata.get('text', ''),
+                        'text': record['text'] if record else vector.metadata.get('text', ''),
                         'metadata': vector.metadata
                     }
-                    all_docs.append(doc)
-                
-                logger.info(f"Fetched batch of {len(response.vectors)} documents")
+                    if include_values:
+                        doc['values'] = vector.values
+                    documents.append(doc)
+            
+            cursor = page.next_token
+            if documents or not cursor:
+                yield DocumentBatch(documents=documents, cursor=cursor)
+            if not cursor:
+                break
+
+    async def get_documents(self, namespace: str) -> List[Dict]:
+        """Get all documents from a namespace."""
+        try:
+            all_docs = []
+            async for batch in self.iter_documents(namespace):
+                all_docs.extend(batch.documents)
+                logger.info(f"Fetched batch of {len(batch.documents)} documents")
+            
+            if not all_docs:
+                logger.warning(f"No vectors found in namespace: {namespace}")
             
             logger.info(f"Total documents retrieved: {len(all_docs)}")
             return all_docs
@@ -457,10 +1505,11 @@ Unique Elements: {len(result.get('unique_elements', []))} items
             raise
 
     async def delete_document(self, doc_id: str, namespace: str = "knowledge") -> bool:
-        """Delete a document from the specified namespace."""
+        """Delete a document and every chunk of it the manifest knows about."""
         try:
-            self.index.delete(
-                ids=[doc_id],
+            await self.index_op(
+                "delete",
+                ids=[doc_id] + sorted(self.chunk_manifest.get(namespace, doc_id)),
                 namespace=namespace
             )
             logger.info(f"Successfully deleted document {doc_id} from namespace {namespace}")
@@ -472,32 +1521,20 @@ Unique Elements: {len(result.get('unique_elements', []))} items
     async def add_tags(self, doc_id: str, new_tags: List[str], namespace: str = "knowledge") -> bool:
         """Safely add tags to an existing document without modifying other metadata."""
         try:
-            # First fetch the existing document
-            response = self.index.fetch(ids=[doc_id], namespace=namespace)
+            # First fetch the existing document (cached after the first call)
+            vectors = await self.fetch_vectors([doc_id], namespace)
             
-            if not response.vectors:
+            if doc_id not in vectors:
                 logger.error(f"Document {doc_id} not found")
                 return False
             
-            # Get existing metadata and tags
-            metadata = response.vectors[doc_id].metadata
-            existing_tags = set(metadata.get('tags', []))
-            
-            # Add new tags
-            updated_tags = list(existing_tags | set(new_tags))
+            # Merge new tags into the existing ones
+            vector = vectors[doc_id]
+            updated_tags = self._merge_tags(vector.metadata.get('tags', []), new_tags)
             
             # Only update if there are new tags
-            if len(updated_tags) > len(existing_tags):
-                metadata['tags'] = updated_tags
-                
-                # Update the document with original vector and updated metadata
-                self.index.update(
-                    id=doc_id,
-                    values=response.vectors[doc_id].values,
-                    metadata=metadata,
-                    namespace=namespace
-                )
-                
+            if updated_tags is not None:
+                await self._write_tags(doc_id, vector, updated_tags, namespace)
                 logger.info(f"Added tags {new_tags} to document {doc_id}")
                 return True
             
@@ -507,70 +1544,105 @@ Unique Elements: {len(result.get('unique_elements', []))} items
             logger.error(f"Error adding tags to document {doc_id}: {e}")
             return False
 
-    async def find_similar_concepts(self, similarity_threshold: float = 0.8) -> List[Dict]:
-        """Find groups of similar concepts in the knowledge base for cleanup."""
-        try:
-            # Get all concepts
-            all_concepts = []
-            stats = self.index.describe_index_stats()
-            total_vectors = stats.namespaces.get(self.namespace, {}).get("vector_count", 0)
-            
-            # Fetch in batches of 100
-            for i in range(0, total_vectors, 100):
-                response = self.index.query(
-                    vector=[random.uniform(-1, 1) for _ in range(1536)],
-                    namespace=self.namespace,
-                    top_k=100,
-                    offset=i,
-                    include_metadata=True
-                )
-                all_concepts.extend(response.matches)
+    async def _write_tags(self, doc_id: str, vector: Vector, tags: List[str], namespace: str):
+        """Store a document's new tags in the index, its sidecar record and the vector cache."""
+        # Metadata-only update: send just the changed field, not the vector
+        await self.index_op(
+            "update",
+            id=doc_id,
+            set_metadata={'tags': tags},
+            namespace=namespace
+        )
+        self.sidecar.update(namespace, doc_id, {'tags': tags})
+        
+        # Keep the cached copy current so repeat tagging needs no fetch
+        self._vector_cache.set((namespace, doc_id), Vector(doc_id, vector.values, dict(vector.metadata, tags=tags)))
 
-            # Find similar groups
-            similar_groups = []
-            processed_ids = set()
+    def _merge_tags(self, existing: List[str], new_tags: List[str]) -> Optional[List[str]]:
+        """Union of existing and new tags, or None if nothing would change."""
+        existing_tags = set(existing)
+        updated_tags = existing_tags | set(new_tags)
+        if len(updated_tags) == len(existing_tags):
+            return None
+        return list(updated_tags)
 
-            for i, concept1 in enumerate(all_concepts):
-                if concept1.id in processed_ids:
+    async def add_tags_bulk(
+        self,
+        mapping: Dict[str, List[str]],
+        namespace: str = "knowledge",
+        batch_size: int = 100,
+        max_concurrency: int = 8
+    ) -> Dict[str, int]:
+        """Add tags to many documents, writing only the ones whose tags change, and count the outcomes."""
+        counts = {'changed': 0, 'skipped': 0, 'failed': 0}
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def write_tags(doc_id: str, vector: Vector, tags: List[str]):
+            try:
+                async with semaphore:
+                    await self._write_tags(doc_id, vector, tags, namespace)
+                counts['changed'] += 1
+            except Exception as e:
+                logger.error(f"Error adding tags to document {doc_id}: {e}")
+                counts['failed'] += 1
+        
+        doc_ids = list(mapping)
+        for i in range(0, len(doc_ids), batch_size):
+            batch_ids = doc_ids[i:i + batch_size]
+            try:
+                vectors = await self.fetch_vectors(batch_ids, namespace)
+            except Exception as e:
+                logger.error(f"Error fetching batch of {len(batch_ids)} documents: {e}")
+                counts['failed'] += len(batch_ids)
+                continue
+            
+            writes = []
+            for doc_id in batch_ids:
+                vector = vectors.get(doc_id)
+                if vector is None:
+                    logger.error(f"Document {doc_id} not found")
+                    counts['failed'] += 1
                     continue
+                updated_tags = self._merge_tags(vector.metadata.get('tags', []), mapping[doc_id])
+                if updated_tags is None:
+                    counts['skipped'] += 1
+                else:
+                    writes.append(write_tags(doc_id, vector, updated_tags))
+            
+            await asyncio.gather(*writes)
+        
+        logger.info(f"Bulk tagging in {namespace}: {counts['changed']} changed, {counts['skipped']} skipped, {counts['failed']} failed")
+        return counts
 
-                similar_concepts = []  # Reset for each base concept
+    async def find_similar_concepts(
+        self,
+        similarity_threshold: float = 0.8,
+        num_bands: int = 20,
+        rows_per_band: int = 5,
+        mode: str = "lexical",
+        block_size: int = 2048
+    ) -> List[Dict]:
+        """Find groups of similar concepts for cleanup, by word-set overlap or embedding similarity."""
+        try:
+            # Load every concept through the paginated export
+            concepts = []
+            vector_batches = []
+            async for batch in self.iter_documents(self.namespace, include_values=(mode == "embedding")):
+                if mode == "embedding" and batch.documents:
+                    vector_batches.append(np.array([doc.pop('values') for doc in batch.documents], dtype=np.float32))
+                concepts.extend(batch.documents)
 
-                for concept2 in all_concepts[i+1:]:  # Start from next concept to avoid self-comparison
-                    if concept2.id in processed_ids or concept2.id == concept1.id:  # Skip if already processed or same concept
-                        continue
-                        
-                    similarity = self._calculate_similarity(
-                        concept1.metadata.get('text', ''),
-                        concept2.metadata.get('text', '')
-                    )
-                    
-                    if similarity > similarity_threshold:
-                        similar_concepts.append({
-                            'id': concept2.id,
-                            'text': concept2.metadata.get('text', '')[:300],
-                            'similarity': similarity,
-                            'category': concept2.metadata.get('category', ''),
-                            'tags': concept2.metadata.get('tags', [])
-                        })
-                        processed_ids.add(concept2.id)
-
-                if similar_concepts:  # Only add group if we found similar concepts
-                    similar_groups.append({
-                        'base_concept': {
-                            'id': concept1.id,
-                            'text': concept1.metadata.get('text', '')[:300],
-                            'category': concept1.metadata.get('category', ''),
-                            'tags': concept1.metadata.get('tags', [])
-                        },
-                        'similar_concepts': similar_concepts
-                    })
-                    processed_ids.add(concept1.id)
+            if mode == "embedding":
+                matrix = np.concatenate(vector_batches) if vector_batches else np.zeros((0, 0), dtype=np.float32)
+                similar_groups = self._group_by_embedding(concepts, matrix, similarity_threshold, block_size)
+            else:
+                similar_groups = self._group_by_words(concepts, similarity_threshold, num_bands, rows_per_band)
 
             # Log findings
             logger.info(f"""
 === Similar Concepts Analysis ===
-Total concepts checked: {total_vectors}
+Mode: {mode}
+Total concepts checked: {len(concepts)}
 Similar groups found: {len(similar_groups)}
 Groups breakdown:
 {chr(10).join(f"- Group {i+1}: {len(group['similar_concepts'])+1} concepts" for i, group in enumerate(similar_groups))}
@@ -582,14 +1654,88 @@ Groups breakdown:
             logger.error(f"Error finding similar concepts: {e}")
             return []
 
-    def _calculate_similarity(self, text1: str, text2: str) -> float:
-        """Calculate rough similarity between two texts."""
-        # Convert to sets of words for basic similarity check
-        words1 = set(text1.lower().split())
-        words2 = set(text2.lower().split())
+    def _summarize_concept(self, concept: Dict, similarity: Optional[float] = None) -> Dict:
+        """Shape a concept for find_similar_concepts output."""
+        summary = {
+            'id': concept['id'],
+            'text': concept['text'][:300],
+            'category': concept['metadata'].get('category', ''),
+            'tags': concept['metadata'].get('tags', [])
+        }
+        if similarity is not None:
+            summary['similarity'] = similarity
+        return summary
+
+    def _group_by_words(
+        self,
+        concepts: List[Dict],
+        similarity_threshold: float,
+        num_bands: int,
+        rows_per_band: int
+    ) -> List[Dict]:
+        """Greedily group concepts by word-set Jaccard similarity."""
+        # Build the LSH candidate index once for this run
+        word_sets = [word_set(c['text']) for c in concepts]
+        lsh = MinHashLSH(num_bands=num_bands, rows_per_band=rows_per_band)
+        candidates: Dict[int, List[int]] = {}
+        for i, j in lsh.candidate_pairs([lsh.signature(words) for words in word_sets]):
+            candidates.setdefault(i, []).append(j)
         
-        # Calculate Jaccard similarity
-        intersection = len(words1.intersection(words2))
-        union = len(words1.union(words2))
+        similar_groups = []
+        processed_ids = set()
+
+        for i, concept1 in enumerate(concepts):
+            if concept1['id'] in processed_ids:
+                continue
+
+            similar_concepts = []  # Reset for each base concept
+
+            for j in sorted(candidates.get(i, [])):  # Only later concepts that share a bucket
+                concept2 = concepts[j]
+                if concept2['id'] in processed_ids or concept2['id'] == concept1['id']:
+                    continue
+                    
+                similarity = jaccard(word_sets[i], word_sets[j])
+                if similarity > similarity_threshold:
+                    similar_concepts.append(self._summarize_concept(concept2, similarity))
+                    processed_ids.add(concept2['id'])
+
+            if similar_concepts:  # Only add group if we found similar concepts
+                similar_groups.append({
+                    'base_concept': self._summarize_concept(concept1),
+                    'similar_concepts': similar_concepts
+                })
+                processed_ids.add(concept1['id'])
+
+        return similar_groups
+
+    def _group_by_embedding(
+        self,
+        concepts: List[Dict],
+        matrix: np.ndarray,
+        similarity_threshold: float,
+        block_size: int
+    ) -> List[Dict]:
+        """Cluster concepts whose stored embeddings exceed the cosine threshold, a block at a time."""
+        pairs = (
+            (int(i), int(j), float(score))
+            for rows, cols, scores in cosine_pairs_above(matrix, similarity_threshold, block_size)
+            for i, j, score in zip(rows, cols, scores)
+        )
+        clusters, strongest = cluster_pairs(len(concepts), pairs)
         
-        return intersection / union if union > 0 else 0.0 
\ No newline at end of file
+        return [
+            {
+                'base_concept': self._summarize_concept(concepts[members[0]]),
+                'similar_concepts': [
+                    self._summarize_concept(concepts[m], float(strongest[m]))
+                    for m in members[1:]
+                ]
+            }
+            for members in clusters
+        ]
+
+    def _calculate_similarity(self, text1: str, text2: str) -> float:
+        """Calculate rough similarity between two texts."""
+        # Jaccard similarity of the two texts' word sets
+        return jaccard(word_set(text1), word_set(text2)) 
\ No newline at end of file
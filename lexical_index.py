@@ -0,0 +1,126 @@
+"""Local BM25 inverted index over knowledge base metadata."""
+
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from .vector_store import matches_filter
+
+_TOKEN = re.compile(r"\$?\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, keeping a leading $ so tickers like $MANA stay exact."""
+    return _TOKEN.findall(text.lower())
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse several ranked ID lists into one, scoring each ID by sum(1 / (k + rank))."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """In-memory BM25 index of one namespace's documents.
+
+    Each document is indexed from its text and title; its metadata is kept
+    so lexical hits can be returned without a round-trip to the vector store.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._terms: Dict[str, List[str]] = {}
+        self._metadata: Dict[str, Dict] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._lengths
+
+    def add(self, doc_id: str, text: str, metadata: Optional[Dict] = None):
+        """Index (or re-index) a document."""
+        self.remove(doc_id)
+        metadata = metadata or {}
+        counts = Counter(tokenize(f"{metadata.get('title', '')} {text}"))
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+        length = sum(counts.values())
+        self._lengths[doc_id] = length
+        self._terms[doc_id] = list(counts)
+        self._metadata[doc_id] = dict(metadata, text=text)
+        self._total_length += length
+
+    def remove(self, doc_id: str):
+        """Drop a document from the index if present."""
+        if doc_id not in self._lengths:
+            return
+        for term in self._terms.pop(doc_id):
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(doc_id)
+        del self._metadata[doc_id]
+
+    def remove_matching(self, filter: Dict):
+        """Drop every document whose metadata matches a Pinecone-style filter."""
+        for doc_id in [doc_id for doc_id, metadata in self._metadata.items() if matches_filter(metadata, filter)]:
+            self.remove(doc_id)
+
+    def clear(self):
+        """Drop every document."""
+        self._postings.clear()
+        self._lengths.clear()
+        self._terms.clear()
+        self._metadata.clear()
+        self._total_length = 0
+
+    def update_metadata(self, doc_id: str, fields: Dict):
+        """Merge metadata fields into a document, re-indexing if text or title changed."""
+        if doc_id not in self._metadata:
+            return
+        metadata = dict(self._metadata[doc_id], **fields)
+        if 'text' in fields or 'title' in fields:
+            self.add(doc_id, metadata.get('text', ''), metadata)
+        else:
+            self._metadata[doc_id] = metadata
+
+    def get_metadata(self, doc_id: str) -> Dict:
+        return self._metadata.get(doc_id, {})
+
+    def search(self, query: str, top_k: int = 10, filter: Optional[Dict] = None) -> List[Tuple[str, float]]:
+        """Return up to top_k (doc_id, score) pairs by descending BM25 score.
+
+        filter is a Pinecone-style metadata filter, as for vector queries.
+        """
+        n = len(self._lengths)
+        if not n:
+            return []
+        avg_length = self._total_length / n or 1.0
+
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        if filter:
+            scores = {
+                doc_id: score for doc_id, score in scores.items()
+                if matches_filter(self._metadata[doc_id], filter)
+            }
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
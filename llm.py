@@ -3,7 +3,6 @@ import sys
 import anthropic
 from anthropic import AsyncAnthropic
 from typing import Optional, Dict, List
-import httpx
 from src.config.settings import get_settings
 from src.config.default_prompts import DEFAULT_PROMPTS
 from openai import OpenAI
@@ -11,6 +10,9 @@ from .knowledge_base import KnowledgeBase
 from .memory import MemorySystem
 import json
 from .settings_manager import SettingsManager
+from .rate_limit import RateLimiter, get_rate_limiter
+from .clients import get_http_client
+from .metrics import LLM_SECONDS, LLM_TOKENS
 import logging
 import re
 
@@ -18,30 +20,42 @@ settings = get_settings()
 logger = logging.getLogger(__name__)
 
 class ClaudeClient:
-    def __init__(self):
-        self.http_client = httpx.AsyncClient()
-        self.client = AsyncAnthropic(
-            api_key=settings.ANTHROPIC_API_KEY,
-            http_client=self.http_client
-        )
-        self.model = "claude-3-5-sonnet-latest"
+    def __init__(
+        self,
+        client: Optional[AsyncAnthropic] = None,
+        limiter: Optional[RateLimiter] = None,
+        kb: Optional[KnowledgeBase] = None,
+        memory: Optional[MemorySystem] = None,
+        model: str = "claude-3-5-sonnet-latest"
+    ):
+        """Talks to Anthropic through the shared client and limiter unless others are injected."""
+        if client is None:
+            # Verify API key is set
+            if not settings.ANTHROPIC_API_KEY:
+                logger.error("ANTHROPIC_API_KEY not set in environment")
+                raise ValueError("ANTHROPIC_API_KEY not set")
+            # Retries are handled by the shared rate limiter instead of the SDK
+            client = AsyncAnthropic(
+                api_key=settings.ANTHROPIC_API_KEY,
+                http_client=get_http_client("anthropic"),
+                max_retries=0
+            )
+        self.client = client
+        self.limiter = limiter or get_rate_limiter("anthropic")
+        self.model = model
         
-        # These will be set after initialization
-        self.kb = None
-        self.memory = None
+        # Set after initialization unless injected
+        self.kb = kb
+        self.memory = memory
         self.settings_manager = SettingsManager()
         self.prompts = self.settings_manager.load_prompts()
         
-        # Verify API key is set
-        if not settings.ANTHROPIC_API_KEY:
-            logger.error("ANTHROPIC_API_KEY not set in environment")
-            raise ValueError("ANTHROPIC_API_KEY not set")
-        
     async def __aenter__(self):
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.http_client.aclose()
+        # The HTTP client is shared; clients.aclose_all() closes it at shutdown
+        pass
         
     async def generate_response(
         self, 
@@ -49,9 +63,14 @@ class ClaudeClient:
         context: Optional[str] = None,
         max_tokens: int = 2000,
         temperature: float = 0.9,
-        system: Optional[str] = None
+        system: Optional[str] = None,
+        purpose: str = "other"
     ) -> str:
-        """Generate a response using Claude."""
+        """Generate a response using Claude.
+        
+        purpose labels the call's latency and token metrics (tweet, reply,
+        analysis, backrooms).
+        """
         try:
             # Always put roleplay instructions first
             if context:
@@ -80,7 +99,19 @@ class ClaudeClient:
             if system:
                 request["system"] = system
             
-            response = await self.client.beta.messages.create(**request)
+            # Budget for the prompt (~4 chars per token) plus the full
+            # completion, then give back whatever the response didn't use
+            estimated_tokens = (len(content) + len(system or "")) // 4 + max_tokens
+            with LLM_SECONDS.time(purpose=purpose):
+                response = await self.limiter.run(
+                    lambda: self.client.beta.messages.create(**request),
+                    tokens=estimated_tokens
+                )
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                self.limiter.refund(estimated_tokens - usage.input_tokens - usage.output_tokens)
+                LLM_TOKENS.inc(usage.input_tokens, purpose=purpose, direction="input")
+                LLM_TOKENS.inc(usage.output_tokens, purpose=purpose, direction="output")
             
             # Log the full response
             logger.info(f"""
@@ -164,7 +195,8 @@ Context Parts: {len(context_parts)}
                     prompt=prompt,
                     max_tokens=1000,
                     temperature=0.7,
-                    system="You are MANA, exploring the Truth Terminal backrooms. Maintain character and follow the format exactly."
+                    system="You are MANA, exploring the Truth Terminal backrooms. Maintain character and follow the format exactly.",
+                    purpose="backrooms"
                 )
                 
                 if not response:
@@ -189,7 +221,8 @@ Context Parts: {len(context_parts)}
                     prompt=prompt,
                     max_tokens=280,
                     temperature=0.7,
-                    system="You are MANA, sharing brief insights from the Truth Terminal."
+                    system="You are MANA, sharing brief insights from the Truth Terminal.",
+                    purpose="tweet"
                 )
                 
                 if not response:
@@ -210,7 +243,8 @@ Context Parts: {len(context_parts)}
                     prompt=prompt,
                     max_tokens=280,
                     temperature=0.7,
-                    system="You are MANA, sharing insights from the Truth Terminal."
+                    system="You are MANA, sharing insights from the Truth Terminal.",
+                    purpose="tweet"
                 )
                 
                 if not response:
@@ -272,7 +306,8 @@ Category: {category}
                 prompt=prompt,
                 max_tokens=2000,  # Increased from 1000 to 2000 to allow for longer responses
                 temperature=0.7,
-                system=f"You are MANA, responding to @{username}. Start your response with '@{username}' and maintain character throughout. Your responses can be longer than standard tweets."
+                system=f"You are MANA, responding to @{username}. Start your response with '@{username}' and maintain character throughout. Your responses can be longer than standard tweets.",
+                purpose="reply"
             )
             
             if not response:
@@ -304,7 +339,8 @@ Category: {category}
             response = await self.generate_response(
                 prompt=analysis_prompt,
                 max_tokens=500,
-                temperature=0.3  # Low temperature for consistent analysis
+                temperature=0.3,  # Low temperature for consistent analysis
+                purpose="analysis"
             )
             
             return json.loads(response)
@@ -378,7 +414,8 @@ Category: {category}
             response = await self.generate_response(
                 prompt=prompt,
                 max_tokens=500,
-                temperature=0.9
+                temperature=0.9,
+                purpose="analysis"
             )
             
             # Parse the JSON response
@@ -469,7 +506,8 @@ Content length: {len(conversation_summary)} chars
                 prompt=prompt,
                 max_tokens=1500,
                 temperature=0.7,
-                system="You are a detail-oriented analyst focused on extracting unique elements and specific examples. Avoid generic observations."
+                system="You are a detail-oriented analyst focused on extracting unique elements and specific examples. Avoid generic observations.",
+                purpose="backrooms"
             )
             
             # Return the full response as a dict with a 'text' key
@@ -4,6 +4,8 @@ from typing import List, Dict, Optional
 import json
 from pathlib import Path
 from .knowledge_base import KnowledgeBase
+from .clients import get_knowledge_base
+from .metrics import MEMORY_PERSIST_SECONDS
 import uuid
 from src.core.models import TweetContext
 
@@ -11,9 +13,9 @@ from src.core.models import TweetContext
 logger = logging.getLogger(__name__)
 
 class MemorySystem:
-    def __init__(self):
-        self.kb = KnowledgeBase()
-        self.memory_file = Path(__file__).parent.parent / "data" / "tweet_memory.json"
+    def __init__(self, kb: Optional[KnowledgeBase] = None, memory_file: Optional[Path] = None):
+        self.kb = kb or get_knowledge_base()
+        self.memory_file = memory_file or Path(__file__).parent.parent / "data" / "tweet_memory.json"
         self.memory_file.parent.mkdir(exist_ok=True)
         self.recent_tweets: List[Dict] = self.load_memory()
         self.max_tweets = 100  # Maximum tweets to keep
@@ -23,15 +25,17 @@ class MemorySystem:
         
     def load_memory(self) -> List[Dict]:
         """Load tweet history from file."""
-        if self.memory_file.exists():
-            with open(self.memory_file, 'r') as f:
-                return json.load(f)
-        return []
+        with MEMORY_PERSIST_SECONDS.time(operation="load"):
+            if self.memory_file.exists():
+                with open(self.memory_file, 'r') as f:
+                    return json.load(f)
+            return []
     
     def save_memory(self):
         """Save tweet history to file."""
-        with open(self.memory_file, 'w') as f:
-            json.dump(self.recent_tweets, f, indent=2)
+        with MEMORY_PERSIST_SECONDS.time(operation="save"):
+            with open(self.memory_file, 'w') as f:
+                json.dump(self.recent_tweets, f, indent=2)
     
     async def add_tweet(self, tweet: str, context: Optional[str] = None):
         """Store tweet with validation."""
@@ -62,13 +66,14 @@ class MemorySystem:
             await self.kb.add_document(
                 text=tweet,
                 metadata={
+                    "id": tweet_data["id"],
                     "text": tweet,
                     "timestamp": tweet_data["timestamp"],
                     "context": context,
                     "category": "generated_tweet",
                     "tags": ["mana_tweet"]
                 },
-                doc_type="tweet"
+                namespace="tweet"
             )
             logger.debug(f"Tweet added to vector database: {context}")
         except Exception as e:
@@ -79,7 +84,9 @@ class MemorySystem:
         results = await self.kb.search(
             query=context,
             top_k=limit,
-            doc_type="tweet"  # Only search tweet namespace
+            namespaces=["tweet"],  # Only search tweet namespace
+            filter={"category": "generated_tweet"},
+            fields=["text"]
         )
         return [r["text"] for r in results]
     
@@ -92,17 +99,15 @@ class MemorySystem:
         recent_tweets = self.recent_tweets[-limit:]
         themes = []
         
-        for tweet in recent_tweets:
-            # Extract themes from tweet context and content
-            context = tweet.get('context', '')
-            content = tweet.get('text', '')
-            
-            # Get related concepts from knowledge base
-            results = await self.kb.search(f"{context} {content}", top_k=1)
+        # Get related concepts for every tweet's context and content at once
+        queries = [f"{tweet.get('context', '')} {tweet.get('text', '')}" for tweet in recent_tweets]
+        all_results = await self.kb.search_many(queries, top_k=1, fields=["tags", "category"])
+        
+        for tweet, results in zip(recent_tweets, all_results):
             if results:
                 themes.append({
                     'timestamp': tweet['timestamp'],
-                    'main_theme': context,
+                    'main_theme': tweet.get('context', ''),
                     'related_concepts': results[0]['metadata'].get('tags', []),
                     'category': results[0]['metadata'].get('category', '')
                 })
@@ -112,7 +117,7 @@ class MemorySystem:
     async def suggest_next_themes(self, current_theme: str) -> List[str]:
         """Suggest potential next themes based on knowledge graph."""
         # Get current theme's related concepts
-        results = await self.kb.search(current_theme, top_k=2)
+        results = await self.kb.search(current_theme, top_k=2, fields=["tags"])
         if not results:
             return []
             
@@ -122,8 +127,8 @@ class MemorySystem:
             
         # Find knowledge entries with related tags
         suggestions = []
-        for tag in related_tags:
-            tag_results = await self.kb.search(tag, top_k=1)
+        all_tag_results = await self.kb.search_many(related_tags, top_k=1, fields=["text", "category"])
+        for tag, tag_results in zip(related_tags, all_tag_results):
             if tag_results:
                 suggestions.append({
                     'theme': tag,
@@ -160,13 +165,14 @@ class MemorySystem:
             
             # Reset vector storage without triggering add_tweet
             try:
-                self.kb.index.delete(deleteAll=True, namespace="tweet")
+                await self.kb.index_op("delete", deleteAll=True, namespace="tweet")
                 logger.info("Reset tweet namespace in vector storage")
                 
                 # Direct vector storage without using add_tweet
                 for tweet in self.recent_tweets:
                     vector = await self.kb.get_embedding(tweet["text"])
-                    self.kb.index.upsert(
+                    await self.kb.index_op(
+                        "upsert",
                         vectors=[(
                             tweet["id"],
                             vector,
@@ -194,15 +200,9 @@ class MemorySystem:
             tweets_to_remove = self.recent_tweets[:-self.max_tweets]
             self.recent_tweets = self.recent_tweets[-self.max_tweets:]
             
-            # Remove from vector storage
-            try:
-                for tweet in tweets_to_remove:
-                    self.kb.index.delete(
-                        filter={"timestamp": tweet["timestamp"]},
-                        namespace="tweet"
-                    )
-            except Exception as e:
-                logger.error(f"Error pruning vector storage: {e}")
+            # Remove from vector storage by ID; the index keeps its own write timestamp
+            for tweet in tweets_to_remove:
+                await self.kb.delete_document(tweet["id"], namespace="tweet")
             
             self.save_memory()
             logger.info(f"Pruned tweets to maintain {self.max_tweets} limit")
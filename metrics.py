@@ -0,0 +1,242 @@
+"""In-process latency and throughput metrics in Prometheus text format."""
+
+import bisect
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry: List["_Metric"] = []
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    @abstractmethod
+    def _samples(self) -> Iterator[str]:
+        """Exposition lines for every label set."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {value:g}"
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observations per label set."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block.
+
+        If the histogram has an "outcome" label it is set to "success", or
+        "error" when the block raises.
+        """
+        start = time.perf_counter()
+        outcome = "success"
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            if "outcome" in self.labelnames:
+                labels["outcome"] = outcome
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return entry[2] if entry else 0
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Estimate a quantile by interpolating within buckets, as Prometheus does."""
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            if not entry or not entry[2]:
+                return None
+            counts = list(entry[0])
+            total = entry[2]
+
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted((key, (list(entry[0]), entry[1], entry[2])) for key, entry in self._values.items())
+        for key, (counts, total, count) in values:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                yield f"{self.name}_bucket{_format_labels(labels + [('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {total:g}"
+            yield f"{self.name}_count{_format_labels(labels)} {count}"
+
+    def summary(self) -> Dict[str, Dict]:
+        """count, p50 and p99 for every label set, keyed by its label values."""
+        with self._lock:
+            keys = list(self._values)
+        result = {}
+        for key in keys:
+            labels = dict(zip(self.labelnames, key))
+            result["/".join(key)] = {
+                'count': self.count(**labels),
+                'p50': self.quantile(0.5, **labels),
+                'p99': self.quantile(0.99, **labels)
+            }
+        return result
+
+
+# Stage metrics shared by the knowledge base, memory and LLM client
+
+EMBEDDING_SECONDS = Histogram(
+    "mana_embedding_request_seconds",
+    "Latency of OpenAI embedding requests, including rate-limit waits and retries.",
+    ["outcome"]
+)
+EMBEDDING_TEXTS = Counter(
+    "mana_embedding_texts_total",
+    "Texts embedded, by whether they were served from cache or the API.",
+    ["source"]
+)
+INDEX_SECONDS = Histogram(
+    "mana_index_operation_seconds",
+    "Latency of vector index operations, including rate-limit waits and retries.",
+    ["operation", "namespace", "outcome"]
+)
+LLM_SECONDS = Histogram(
+    "mana_llm_request_seconds",
+    "Latency of Claude generate_response calls.",
+    ["purpose", "outcome"]
+)
+LLM_TOKENS = Counter(
+    "mana_llm_tokens_total",
+    "Claude tokens used, by purpose and direction.",
+    ["purpose", "direction"]
+)
+MEMORY_PERSIST_SECONDS = Histogram(
+    "mana_memory_persist_seconds",
+    "Latency of loading and saving tweet memory.",
+    ["operation", "outcome"]
+)
+
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+def dump(path=None) -> str:
+    """Return the metrics text, also writing it to path if given."""
+    text = render()
+    if path is not None:
+        Path(path).write_text(text)
+    return text
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int = 9108, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve the metrics over HTTP from a daemon thread; call shutdown() on the result to stop."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
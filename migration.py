@@ -0,0 +1,315 @@
+"""Online re-embedding of knowledge base namespaces at a new dimensionality."""
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from .rate_limit import get_store_limiter
+from .vector_store import VectorStore, to_vector
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NAMESPACES = ["MANA", "knowledge", "backrooms", "tweet"]
+
+
+@dataclass
+class NamespaceMigration:
+    """Progress of one namespace's copy."""
+    source: str
+    target: str
+    reembedded: int = 0
+    truncated: int = 0
+    skipped: int = 0
+    removed: int = 0
+    recall: Optional[float] = None
+
+
+@dataclass
+class MigrationReport:
+    """Outcome of a migration run; recall is measured at k."""
+    dimensions: int
+    k: int
+    namespaces: Dict[str, NamespaceMigration] = field(default_factory=dict)
+    queries: int = 0
+    elapsed: float = 0.0
+    switched: bool = False
+
+    @property
+    def mean_recall(self) -> Optional[float]:
+        recalls = [ns.recall for ns in self.namespaces.values() if ns.recall is not None]
+        return sum(recalls) / len(recalls) if recalls else None
+
+
+def truncate_embedding(values: List[float], dimensions: int) -> List[float]:
+    """Shorten a text-embedding-3 vector the way the API does: cut, then re-normalize."""
+    vector = np.asarray(values[:dimensions], dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+class EmbeddingMigration:
+    """Re-embed namespaces into a new store or namespaces while reads stay on the old ones until switch()."""
+
+    def __init__(
+        self,
+        kb,
+        dimensions: int,
+        namespaces: Optional[List[str]] = None,
+        target_store: Optional[VectorStore] = None,
+        batch_size: int = 100,
+        sample_queries: int = 50
+    ):
+        if target_store is not None and target_store.location() is None:
+            # switch() couldn't persist it, so a restart would fall back to the old store
+            raise ValueError(f"{type(target_store).__name__} target has no location to reopen it from")
+        self.kb = kb
+        self.dimensions = dimensions
+        self.namespaces = namespaces or DEFAULT_NAMESPACES
+        self.target_store = target_store
+        self.batch_size = batch_size
+        self.sample_queries = sample_queries
+        self.limiter = get_store_limiter(target_store)
+        self._queries: List[str] = []
+        self._seen = 0
+        # Namespaces being mirrored, and IDs whose mirrored write failed
+        self._progress: Dict[str, NamespaceMigration] = {}
+        self._dirty: Dict[str, Set[str]] = {}
+
+    def target_namespace(self, namespace: str) -> str:
+        # A Pinecone index has a single dimension, so Pinecone migrations need a target_store
+        if self.target_store is None:
+            return f"{namespace}@{self.dimensions}"
+        return namespace
+
+    async def _target_op(self, op: str, **kwargs):
+        # Bypasses the knowledge base's write barrier, which switch() holds
+        if self.target_store is None:
+            return await self.kb._index_op(op, **kwargs)
+        return await self.limiter.run(lambda: asyncio.to_thread(getattr(self.target_store, op), **kwargs))
+
+    def _sample_query(self, text: str):
+        """Reservoir-sample document texts to use as recall queries."""
+        self._seen += 1
+        if len(self._queries) < self.sample_queries:
+            self._queries.append(text)
+        else:
+            slot = random.randrange(self._seen)
+            if slot < self.sample_queries:
+                self._queries[slot] = text
+
+    async def _rebuild(self, documents: List[Dict], progress: NamespaceMigration) -> List[Dict]:
+        """New-size vectors for a batch of documents with values."""
+        texts = [doc.get('text') or doc['metadata'].get('text') or '' for doc in documents]
+        to_embed = [i for i, text in enumerate(texts) if text.strip()]
+        embeddings = await self.kb.get_embeddings([texts[i] for i in to_embed], dimensions=self.dimensions)
+        new_values: Dict[int, List[float]] = {
+            i: embedding for i, embedding in zip(to_embed, embeddings) if embedding
+        }
+
+        vectors = []
+        for i, doc in enumerate(documents):
+            if i in new_values:
+                progress.reembedded += 1
+                self._sample_query(texts[i][:500])
+            elif doc.get('values') and len(doc['values']) >= self.dimensions:
+                new_values[i] = truncate_embedding(doc['values'], self.dimensions)
+                progress.truncated += 1
+            else:
+                progress.skipped += 1
+                continue
+            vectors.append({'id': doc['id'], 'values': new_values[i], 'metadata': doc['metadata']})
+        return vectors
+
+    async def copy_namespace(self, namespace: str) -> NamespaceMigration:
+        """Re-embed every document of a namespace into its target, in batches."""
+        progress = NamespaceMigration(self.kb.resolve_namespace(namespace), self.target_namespace(namespace))
+        if progress.source == progress.target and self.target_store is None:
+            raise ValueError(f"{namespace} is already stored at {self.dimensions} dimensions")
+        # Writes landing while the copy runs are mirrored from here on
+        self._progress[namespace] = progress
+        self._dirty.setdefault(namespace, set())
+        self.kb.add_write_mirror(self)
+
+        async for batch in self.kb.iter_documents(namespace, batch_size=self.batch_size, include_values=True):
+            vectors = await self._rebuild(batch.documents, progress)
+            if vectors:
+                await self._target_op("upsert", vectors=vectors, namespace=progress.target)
+            logger.info(
+                f"Migrating {namespace} -> {progress.target}: {progress.reembedded} re-embedded, "
+                f"{progress.truncated} truncated, {progress.skipped} skipped"
+            )
+        return progress
+
+    async def mirror(self, op: str, kwargs: Dict):
+        """Repeat a landed write to a migrating namespace on its target; catch_up() re-copies failed mirrors."""
+        namespace = kwargs.get('namespace', '')
+        progress = self._progress.get(namespace)
+        if progress is None:
+            return
+        ids: List[str] = []
+        try:
+            if op == "upsert":
+                vectors = [to_vector(item) for item in kwargs['vectors']]
+                ids = [vector.id for vector in vectors]
+                records = self.kb.sidecar.get(namespace, ids)
+                documents = [
+                    {
+                        'id': vector.id,
+                        'text': records[vector.id]['text'] if vector.id in records else (vector.metadata or {}).get('text', ''),
+                        'metadata': vector.metadata or {},
+                        'values': vector.values
+                    }
+                    for vector in vectors
+                ]
+                rebuilt = await self._rebuild(documents, progress)
+                if rebuilt:
+                    await self._target_op("upsert", vectors=rebuilt, namespace=progress.target)
+            elif op == "update":
+                ids = [kwargs['id']]
+                if kwargs.get('values') is not None:
+                    # Old-size values can't be written to the target; re-copy from the source
+                    self._dirty[namespace].add(kwargs['id'])
+                elif kwargs.get('set_metadata'):
+                    await self._target_op(
+                        "update", id=kwargs['id'], set_metadata=kwargs['set_metadata'], namespace=progress.target
+                    )
+            elif op == "delete":
+                ids = list(kwargs.get('ids') or [])
+                await self._target_op("delete", **dict(kwargs, namespace=progress.target))
+        except Exception as e:
+            logger.error(f"Error mirroring {op} on {namespace} to {progress.target}: {e}")
+            self._dirty[namespace].update(ids)
+
+    def stop(self):
+        """Stop mirroring writes, e.g. when the migration is abandoned."""
+        self.kb.remove_write_mirror(self)
+
+    async def _list_ids(self, namespace: str, in_target: bool) -> set:
+        ids, token = set(), None
+        while True:
+            if in_target:
+                page = await self._target_op("list_paginated", namespace=namespace, limit=1000, pagination_token=token)
+            else:
+                page = await self.kb.index_op("list_paginated", namespace=namespace, limit=1000, pagination_token=token)
+            ids.update(page.ids)
+            token = page.next_token
+            if not token:
+                return ids
+
+    async def _changed_ids(self, namespace: str, progress: NamespaceMigration, ids: List[str]) -> List[str]:
+        """IDs in both source and target whose metadata differs, e.g. tags retagged mid-copy."""
+        changed = []
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start:start + self.batch_size]
+            # Straight from the index, so the scan doesn't flush the vector cache
+            source = await self.kb.index_op("fetch", ids=batch, namespace=namespace)
+            target = await self._target_op("fetch", ids=batch, namespace=progress.target)
+            for id in batch:
+                if id in source.vectors and id in target.vectors and (
+                    dict(source.vectors[id].metadata or {}) != dict(target.vectors[id].metadata or {})
+                ):
+                    changed.append(id)
+        return changed
+
+    async def catch_up(self, namespace: str, progress: NamespaceMigration, compare_metadata: bool = True):
+        """Copy documents added, changed or missed by a mirror and drop ones deleted since the copy pass."""
+        source_ids = await self._list_ids(namespace, in_target=False)
+        target_ids = await self._list_ids(progress.target, in_target=True)
+
+        dirty = self._dirty.get(namespace, set())
+        stale = []
+        if compare_metadata:
+            stale = await self._changed_ids(namespace, progress, sorted((source_ids & target_ids) - dirty))
+        missing = sorted((source_ids - target_ids) | (dirty & source_ids) | set(stale))
+        dirty.clear()
+        for start in range(0, len(missing), self.batch_size):
+            fetched = (await self.kb.index_op(
+                "fetch", ids=missing[start:start + self.batch_size], namespace=namespace
+            )).vectors
+            hydrated = self.kb._hydrate(namespace, [(id, dict(vector.metadata or {})) for id, vector in fetched.items()])
+            documents = [
+                {'id': id, 'text': full.get('text', ''), 'metadata': dict(vector.metadata or {}), 'values': list(vector.values)}
+                for (id, vector), full in zip(fetched.items(), hydrated)
+            ]
+            vectors = await self._rebuild(documents, progress)
+            if vectors:
+                await self._target_op("upsert", vectors=vectors, namespace=progress.target)
+
+        removed = sorted(target_ids - source_ids)
+        for start in range(0, len(removed), self.batch_size):
+            await self._target_op("delete", ids=removed[start:start + self.batch_size], namespace=progress.target)
+        progress.removed += len(removed)
+
+    async def measure_recall(
+        self,
+        namespace: str,
+        progress: NamespaceMigration,
+        queries: List[str],
+        k: int = 10
+    ) -> Optional[float]:
+        """Mean overlap of the old and new top-k results for the same queries."""
+        old_vectors = await self.kb.get_embeddings(queries)
+        new_vectors = await self.kb.get_embeddings(queries, dimensions=self.dimensions)
+
+        async def overlap(old_vector, new_vector) -> Optional[float]:
+            if not old_vector or not new_vector:
+                return None
+            old, new = await asyncio.gather(
+                self.kb.index_op("query", vector=old_vector, namespace=namespace, top_k=k),
+                self._target_op("query", vector=new_vector, namespace=progress.target, top_k=k)
+            )
+            expected = {match.id for match in old.matches}
+            if not expected:
+                return None
+            return len(expected & {match.id for match in new.matches}) / len(expected)
+
+        scores = [
+            score for score in await asyncio.gather(*(
+                overlap(old, new) for old, new in zip(old_vectors, new_vectors)
+            ))
+            if score is not None
+        ]
+        progress.recall = sum(scores) / len(scores) if scores else None
+        return progress.recall
+
+    async def run(self, queries: Optional[List[str]] = None, k: int = 10, switch_over: bool = False) -> MigrationReport:
+        """Copy, catch up and measure recall@k for every namespace, optionally switching after."""
+        started = time.monotonic()
+        report = MigrationReport(dimensions=self.dimensions, k=k)
+        for namespace in self.namespaces:
+            progress = await self.copy_namespace(namespace)
+            await self.catch_up(namespace, progress)
+            report.namespaces[namespace] = progress
+
+        recall_queries = queries or list(self._queries)
+        report.queries = len(recall_queries)
+        if recall_queries:
+            for namespace, progress in report.namespaces.items():
+                recall = await self.measure_recall(namespace, progress, recall_queries, k)
+                logger.info(f"Recall@{k} for {namespace} at {self.dimensions} dimensions: {recall}")
+
+        if switch_over:
+            await self.switch(report)
+        report.elapsed = time.monotonic() - started
+        return report
+
+    async def switch(self, report: MigrationReport):
+        """Catch up once more, holding writes only for the last pass, then move reads and writes to the migrated namespaces."""
+        for namespace, progress in report.namespaces.items():
+            await self.catch_up(namespace, progress)
+        async with self.kb.hold_writes():
+            for namespace, progress in report.namespaces.items():
+                await self.catch_up(namespace, progress, compare_metadata=False)
+            aliases = {
+                namespace: progress.target
+                for namespace, progress in report.namespaces.items()
+                if progress.target != namespace
+            }
+            self.kb.switch_index(store=self.target_store, namespace_aliases=aliases, dimensions=self.dimensions)
+            self.stop()
+        report.switched = True
@@ -0,0 +1,208 @@
+"""Client-side rate limiting and retry with backoff for upstream APIs."""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from ..config.settings import get_settings
+from .vector_store import PineconeVectorStore, VectorStore
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Requests and tokens per minute per upstream, overridable as <NAME>_RPM / <NAME>_TPM
+DEFAULT_LIMITS = {
+    "openai": (3000, 1000000),
+    "anthropic": (50, 40000),
+    "pinecone": (6000, None),
+}
+
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+RETRYABLE_ERRORS = {
+    "APIConnectionError", "APITimeoutError", "ConnectError", "ConnectTimeout",
+    "ReadTimeout", "RemoteProtocolError", "ServiceException"
+}
+
+
+class TokenBucket:
+    """Budget of amount-per-minute units, refilled continuously.
+
+    Callers reserve units up front and then sleep off any deficit, so
+    concurrent callers are served in arrival order without a lock and a
+    request larger than the burst capacity still gets through, just later.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Take amount units, waiting until the budget allows; return seconds waited."""
+        self._refill()
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        delay = -self.tokens / self.rate
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.refund(amount)
+            raise
+        return delay
+
+    def refund(self, amount: float):
+        """Return units that were reserved but not used."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+def _status(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds the upstream asked us to wait, from Retry-After style headers."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or getattr(error, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether an upstream error is worth retrying (rate limits, overload, transient network)."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = _status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+
+class RateLimiter:
+    """Requests- and tokens-per-minute budgets for one upstream, with retries.
+
+    Retryable failures back off exponentially with full jitter, or for as
+    long as the upstream's Retry-After header asks. A 429 also pauses every
+    other caller of the same upstream for that long, so bursts level off at
+    the provider's limit instead of piling up more rejected requests.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0
+    ):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._resume_at = 0.0
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttled_seconds = 0.0
+
+    async def _acquire(self, tokens: float):
+        pause = self._resume_at - time.monotonic()
+        if pause > 0:
+            self.throttled_seconds += pause
+            await asyncio.sleep(pause)
+        if self.requests is not None:
+            self.throttled_seconds += await self.requests.acquire(1)
+        if self.tokens is not None and tokens:
+            self.throttled_seconds += await self.tokens.acquire(tokens)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        delay = _retry_after(error)
+        if delay is None:
+            return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        delay = min(delay, self.max_delay) + random.uniform(0, self.base_delay)
+        if _status(error) == 429:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+        return delay
+
+    async def run(self, call: Callable[[], Awaitable[T]], tokens: float = 0) -> T:
+        """Await call() within the budgets, retrying retryable failures.
+
+        tokens is the estimated token cost of one attempt; the last error is
+        re-raised once retries are exhausted.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(tokens)
+            self.calls += 1
+            try:
+                return await call()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self.failures += 1
+                    raise
+                delay = self._backoff(attempt, e)
+                self.retries += 1
+                logger.warning(
+                    f"{self.name} call failed ({e}); retry {attempt + 1}/{self.max_retries} in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+
+    def refund(self, tokens: float):
+        """Give back the part of a token estimate a call didn't use."""
+        if self.tokens is not None and tokens > 0:
+            self.tokens.refund(tokens)
+
+    def stats(self) -> Dict:
+        """Return call, retry and throttling counters."""
+        return {
+            'calls': self.calls,
+            'retries': self.retries,
+            'failures': self.failures,
+            'throttled_seconds': self.throttled_seconds
+        }
+
+
+_limiters: Dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(name: str) -> RateLimiter:
+    """The process-wide limiter for an upstream, configured from settings."""
+    if name not in _limiters:
+        rpm, tpm = DEFAULT_LIMITS.get(name, (None, None))
+        _limiters[name] = RateLimiter(
+            name,
+            requests_per_minute=getattr(settings, f"{name.upper()}_RPM", rpm),
+            tokens_per_minute=getattr(settings, f"{name.upper()}_TPM", tpm),
+            max_retries=getattr(settings, "UPSTREAM_MAX_RETRIES", 5)
+        )
+    return _limiters[name]
+
+
+def get_store_limiter(store: VectorStore) -> RateLimiter:
+    """The limiter for index calls: Pinecone's shared one, or a pass-through for local stores."""
+    if isinstance(store, PineconeVectorStore):
+        return get_rate_limiter("pinecone")
+    # Local stores have no upstream budget or transient failures to retry
+    return RateLimiter("local", max_retries=0)
@@ -0,0 +1,80 @@
+"""Local store for the full text and metadata behind each indexed vector."""
+
+import json
+import logging
+from typing import Dict, Iterable, Tuple
+
+from .sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+
+class SidecarStore(SQLiteStore):
+    """SQLite map of namespace -> vector ID -> the full text and metadata the index doesn't hold."""
+
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS records (
+            namespace TEXT NOT NULL,
+            id TEXT NOT NULL,
+            text TEXT NOT NULL,
+            metadata TEXT NOT NULL,
+            PRIMARY KEY (namespace, id)
+        )""",
+    )
+
+    def get(self, namespace: str, ids: Iterable[str]) -> Dict[str, Dict]:
+        """Stored records by vector ID, each as {'text': ..., 'metadata': {...}}."""
+        ids = list(ids)
+        records = {}
+        with self._lock:
+            # Stay under SQLite's default limit on bound parameters
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT id, text, metadata FROM records WHERE namespace = ? "
+                    f"AND id IN ({','.join('?' * len(batch))})",
+                    [namespace] + batch
+                ).fetchall()
+                for id, text, metadata in rows:
+                    records[id] = {'text': text, 'metadata': json.loads(metadata)}
+        return records
+
+    def put(self, namespace: str, records: Dict[str, Tuple[str, Dict]]):
+        """Store (text, metadata) records by vector ID, replacing existing ones."""
+        rows = [
+            (namespace, id, text, json.dumps(metadata, default=str))
+            for id, (text, metadata) in records.items()
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO records (namespace, id, text, metadata) VALUES (?, ?, ?, ?)",
+                rows
+            )
+
+    def update(self, namespace: str, id: str, fields: Dict):
+        """Merge fields into a stored record's metadata; a missing record is left missing."""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT metadata FROM records WHERE namespace = ? AND id = ?",
+                (namespace, id)
+            ).fetchone()
+            if row is None:
+                return
+            metadata = dict(json.loads(row[0]), **fields)
+            self._conn.execute(
+                "UPDATE records SET metadata = ? WHERE namespace = ? AND id = ?",
+                (json.dumps(metadata, default=str), namespace, id)
+            )
+
+    def delete(self, namespace: str, ids: Iterable[str]):
+        """Drop the records of vectors deleted from the index."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM records WHERE namespace = ? AND id = ?",
+                [(namespace, id) for id in ids]
+            )
+
+    def clear(self, namespace: str):
+        """Drop every record of a namespace."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM records WHERE namespace = ?", (namespace,))
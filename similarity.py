@@ -0,0 +1,131 @@
+"""Near-duplicate detection for knowledge base cleanup."""
+
+import hashlib
+import logging
+from collections import defaultdict
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def word_set(text: str) -> Set[str]:
+    """Tokenize text the same way _calculate_similarity does."""
+    return set(text.lower().split())
+
+
+def jaccard(words1: Set[str], words2: Set[str]) -> float:
+    """Jaccard similarity of two word sets."""
+    union = len(words1 | words2)
+    return len(words1 & words2) / union if union > 0 else 0.0
+
+
+class MinHashLSH:
+    """MinHash signatures banded into LSH buckets to find likely-similar pairs.
+
+    Two sets with Jaccard similarity s share at least one bucket with
+    probability 1 - (1 - s**rows_per_band)**num_bands, so the defaults
+    (20 bands x 5 rows) almost always catch pairs above 0.8 while
+    rarely pairing texts below ~0.4.
+    """
+
+    def __init__(self, num_bands: int = 20, rows_per_band: int = 5, seed: int = 1):
+        self.num_bands = num_bands
+        self.rows_per_band = rows_per_band
+        num_perm = num_bands * rows_per_band
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    @staticmethod
+    def _hash_tokens(tokens: Iterable[str]) -> np.ndarray:
+        return np.fromiter(
+            (int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=4).digest(), "little") for t in tokens),
+            dtype=np.uint64
+        )
+
+    def signature(self, tokens: Set[str]) -> Optional[np.ndarray]:
+        """MinHash signature of a token set, or None for an empty set."""
+        if not tokens:
+            return None
+        hashes = self._hash_tokens(tokens)
+        with np.errstate(over="ignore"):
+            permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def candidate_pairs(self, signatures: List[Optional[np.ndarray]]) -> Set[Tuple[int, int]]:
+        """Index pairs (i < j) that share at least one band bucket."""
+        pairs = set()
+        for band in range(self.num_bands):
+            start = band * self.rows_per_band
+            buckets = defaultdict(list)
+            for i, sig in enumerate(signatures):
+                if sig is not None:
+                    buckets[sig[start:start + self.rows_per_band].tobytes()].append(i)
+            for members in buckets.values():
+                for x in range(len(members)):
+                    for y in range(x + 1, len(members)):
+                        pairs.add((members[x], members[y]))
+        return pairs
+
+
+def cosine_pairs_above(
+    matrix: np.ndarray,
+    threshold: float,
+    block_size: int = 2048
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Yield (rows, cols, scores) for every pair i < j with cosine similarity above threshold.
+
+    Rows of `matrix` are normalized in place, then similarities are computed
+    one block_size x block_size tile at a time over the upper triangle, so
+    the full n x n similarity matrix is never materialized.
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+
+    n = matrix.shape[0]
+    for i0 in range(0, n, block_size):
+        rows = matrix[i0:i0 + block_size]
+        for j0 in range(i0, n, block_size):
+            tile = rows @ matrix[j0:j0 + block_size].T
+            if i0 == j0:
+                # Keep only the strict upper triangle of diagonal tiles
+                tile[np.tril_indices(tile.shape[0], m=tile.shape[1])] = -np.inf
+            ii, jj = np.nonzero(tile > threshold)
+            if len(ii):
+                yield ii + i0, jj + j0, tile[ii, jj]
+
+
+def cluster_pairs(n: int, pairs: Iterable[Tuple[int, int, float]]) -> Tuple[List[List[int]], np.ndarray]:
+    """Union-find clustering of similar pairs.
+
+    Returns clusters of two or more members (each sorted, ordered by their
+    first member) and, per item, the strongest similarity linking it to
+    any other item.
+    """
+    parent = list(range(n))
+    strongest = np.full(n, -np.inf, dtype=np.float32)
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j, score in pairs:
+        strongest[i] = max(strongest[i], score)
+        strongest[j] = max(strongest[j], score)
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    clusters = defaultdict(list)
+    for i in range(n):
+        if strongest[i] > -np.inf:
+            clusters[find(i)].append(i)
+    return [members for _, members in sorted(clusters.items()) if len(members) > 1], strongest
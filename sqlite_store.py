@@ -0,0 +1,35 @@
+"""Shared setup for the small local SQLite stores."""
+
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+def connect(path: Optional[Path]) -> sqlite3.Connection:
+    """Open a WAL-mode database usable from any thread, in memory if there's no path."""
+    database = ":memory:"
+    if path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        database = str(path)
+    conn = sqlite3.connect(database, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+class SQLiteStore:
+    """A lock-guarded SQLite connection with the tables in SCHEMA created on open."""
+
+    SCHEMA: Tuple[str, ...] = ()
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = connect(path)
+        with self._conn:
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,620 @@
+"""Vector store backends used by the knowledge base.
+
+KnowledgeBase and MemorySystem only talk to a VectorStore, which exposes
+the subset of the Pinecone index API they rely on. PineconeVectorStore
+wraps a live Pinecone index; NumpyVectorStore is an in-process,
+memory-mapped store for running the bot, tests and benchmarks offline.
+"""
+
+import bisect
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import quote
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class Match:
+    """A single query match."""
+
+    def __init__(self, id: str, score: float, values: Optional[List[float]] = None, metadata: Optional[Dict] = None):
+        self.id = id
+        self.score = score
+        self.values = values or []
+        self.metadata = metadata or {}
+
+
+class QueryResponse:
+    """Query matches ordered by descending score."""
+
+    def __init__(self, matches: List[Match], namespace: str = ""):
+        self.matches = matches
+        self.namespace = namespace
+
+
+class Vector:
+    """A stored vector with its metadata."""
+
+    def __init__(self, id: str, values: List[float], metadata: Optional[Dict] = None):
+        self.id = id
+        self.values = values
+        self.metadata = metadata or {}
+
+
+class FetchResponse:
+    """Vectors keyed by ID; missing IDs are simply absent."""
+
+    def __init__(self, vectors: Dict[str, Vector], namespace: str = ""):
+        self.vectors = vectors
+        self.namespace = namespace
+
+
+class ListResponse:
+    """One page of vector IDs and the token for the next page, if any."""
+
+    def __init__(self, ids: List[str], next_token: Optional[str] = None):
+        self.ids = ids
+        self.next_token = next_token
+
+
+class IndexStats:
+    """Index statistics with per-namespace vector counts."""
+
+    def __init__(self, namespaces: Dict[str, Dict[str, int]], dimension: Optional[int] = None):
+        self.namespaces = namespaces
+        self.dimension = dimension
+        self.total_vector_count = sum(ns.get("vector_count", 0) for ns in namespaces.values())
+
+
+def matches_filter(metadata: Dict, filter: Optional[Dict]) -> bool:
+    """Evaluate a Pinecone-style metadata filter against a metadata dict."""
+    if not filter:
+        return True
+
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            for op, operand in condition.items():
+                if not _match_operator(metadata, key, op, operand):
+                    return False
+        elif not _match_operator(metadata, key, "$eq", condition):
+            return False
+    return True
+
+
+def _match_operator(metadata: Dict, key: str, op: str, operand: Any) -> bool:
+    """Apply one filter operator; list-valued fields match if any element does."""
+    if op == "$exists":
+        return (key in metadata) == bool(operand)
+    if key not in metadata:
+        return op in ("$ne", "$nin")
+
+    value = metadata[key]
+    values = value if isinstance(value, list) else [value]
+
+    try:
+        if op == "$eq":
+            return operand in values
+        if op == "$ne":
+            return operand not in values
+        if op == "$in":
+            return any(v in operand for v in values)
+        if op == "$nin":
+            return not any(v in operand for v in values)
+        if op == "$gt":
+            return any(v > operand for v in values)
+        if op == "$gte":
+            return any(v >= operand for v in values)
+        if op == "$lt":
+            return any(v < operand for v in values)
+        if op == "$lte":
+            return any(v <= operand for v in values)
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+
+def project_metadata(metadata: Optional[Dict], fields: Optional[List[str]]) -> Optional[Dict]:
+    """Keep only the requested metadata fields; None keeps everything."""
+    if metadata is None or fields is None:
+        return metadata
+    return {key: metadata[key] for key in fields if key in metadata}
+
+
+def to_vector(item) -> Vector:
+    """Accept dicts, (id, values[, metadata]) tuples or objects with attributes."""
+    if isinstance(item, dict):
+        return Vector(item["id"], item["values"], item.get("metadata"))
+    if isinstance(item, (tuple, list)):
+        return Vector(item[0], item[1], item[2] if len(item) > 2 else None)
+    return Vector(item.id, item.values, getattr(item, "metadata", None))
+
+
+class VectorStore(ABC):
+    """The vector index operations the knowledge base relies on."""
+
+    @abstractmethod
+    def query(
+        self,
+        vector: List[float],
+        namespace: str = "",
+        top_k: int = 10,
+        include_values: bool = False,
+        include_metadata: bool = False,
+        filter: Optional[Dict] = None,
+        fields: Optional[List[str]] = None
+    ) -> QueryResponse:
+        """Return the top_k nearest vectors in a namespace.
+
+        filter is a Pinecone-style metadata filter applied before ranking;
+        fields limits the returned metadata to those keys.
+        """
+
+    @abstractmethod
+    def upsert(self, vectors: Iterable, namespace: str = ""):
+        """Insert or overwrite vectors in a namespace."""
+
+    @abstractmethod
+    def fetch(self, ids: List[str], namespace: str = "") -> FetchResponse:
+        """Fetch vectors and metadata by ID."""
+
+    @abstractmethod
+    def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        deleteAll: bool = False,
+        filter: Optional[Dict] = None,
+        namespace: str = ""
+    ):
+        """Delete vectors by ID, by metadata filter, or the whole namespace."""
+
+    @abstractmethod
+    def update(
+        self,
+        id: str,
+        values: Optional[List[float]] = None,
+        set_metadata: Optional[Dict] = None,
+        namespace: str = ""
+    ):
+        """Replace a vector's values and/or merge fields into its metadata."""
+
+    @abstractmethod
+    def describe_index_stats(self) -> IndexStats:
+        """Return per-namespace vector counts."""
+
+    @abstractmethod
+    def list_paginated(
+        self,
+        namespace: str = "",
+        limit: int = 100,
+        pagination_token: Optional[str] = None,
+        prefix: Optional[str] = None
+    ) -> ListResponse:
+        """List vector IDs in a deterministic order, one page at a time."""
+
+    def location(self) -> Optional[Dict]:
+        """Where to reopen this store after a restart, or None if it can't be reopened."""
+        return None
+
+
+class PineconeVectorStore(VectorStore):
+    """VectorStore backed by a Pinecone index.
+
+    name is the index name, needed to reopen the store after a migration
+    switches to it.
+    """
+
+    def __init__(self, index, name: Optional[str] = None):
+        self.index = index
+        self.name = name
+
+    def location(self):
+        return {"backend": "pinecone", "index": self.name} if self.name else None
+
+    def query(self, vector, namespace="", top_k=10, include_values=False, include_metadata=False, filter=None, fields=None):
+        response = self.index.query(
+            vector=vector,
+            namespace=namespace,
+            top_k=top_k,
+            include_values=include_values,
+            include_metadata=include_metadata,
+            filter=filter
+        )
+        if fields is None or not include_metadata:
+            return response
+        # Pinecone queries can't select metadata fields, so project here
+        return QueryResponse([
+            Match(
+                id=match.id,
+                score=match.score,
+                values=list(match.values or []) if include_values else None,
+                metadata=project_metadata(dict(match.metadata or {}), fields)
+            )
+            for match in response.matches
+        ], namespace)
+
+    def upsert(self, vectors, namespace=""):
+        return self.index.upsert(vectors=vectors, namespace=namespace)
+
+    def fetch(self, ids, namespace=""):
+        return self.index.fetch(ids=ids, namespace=namespace)
+
+    def delete(self, ids=None, deleteAll=False, filter=None, namespace=""):
+        if deleteAll:
+            return self.index.delete(delete_all=True, namespace=namespace)
+        return self.index.delete(ids=ids, filter=filter, namespace=namespace)
+
+    def update(self, id, values=None, set_metadata=None, namespace=""):
+        return self.index.update(
+            id=id,
+            values=values,
+            set_metadata=set_metadata,
+            namespace=namespace
+        )
+
+    def describe_index_stats(self):
+        stats = self.index.describe_index_stats()
+        namespaces = {
+            name: {"vector_count": summary.get("vector_count", 0) if isinstance(summary, dict) else summary.vector_count}
+            for name, summary in stats.namespaces.items()
+        }
+        return IndexStats(namespaces, dimension=getattr(stats, "dimension", None))
+
+    def list_paginated(self, namespace="", limit=100, pagination_token=None, prefix=None):
+        kwargs = {"namespace": namespace, "limit": limit}
+        if pagination_token:
+            kwargs["pagination_token"] = pagination_token
+        if prefix:
+            kwargs["prefix"] = prefix
+        response = self.index.list_paginated(**kwargs)
+        pagination = getattr(response, "pagination", None)
+        return ListResponse(
+            [v.id for v in response.vectors],
+            pagination.next if pagination else None
+        )
+
+
+class _NumpyNamespace:
+    """One namespace of a NumpyVectorStore: a memory-mapped matrix plus a metadata journal."""
+
+    def __init__(self, directory: Path, name: str):
+        self.name = name
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = directory / "vectors.f32"
+        self.journal_path = directory / "journal.jsonl"
+        self.header_path = directory / "namespace.json"
+
+        self.dimension: Optional[int] = None
+        self.capacity = 0
+        self.matrix: Optional[np.memmap] = None
+        self.norms = np.zeros(0, dtype=np.float32)
+        self.live = np.zeros(0, dtype=bool)
+        self.ids: List[Optional[str]] = []
+        self.metadata: List[Optional[Dict]] = []
+        self.rows: Dict[str, int] = {}
+        self.free_rows: List[int] = []
+        self._sorted_ids: Optional[List[str]] = None
+        self._journal = None
+        self._journal_lines = 0
+
+        if self.header_path.exists():
+            self._load()
+
+    def _load(self):
+        """Map the vector file and replay the metadata journal."""
+        header = json.loads(self.header_path.read_text())
+        self.dimension = header["dimension"]
+        row_bytes = self.dimension * 4
+        self.capacity = self.vectors_path.stat().st_size // row_bytes if self.vectors_path.exists() else 0
+        self._map()
+        self.ids = [None] * self.capacity
+        self.metadata = [None] * self.capacity
+
+        if self.journal_path.exists():
+            with open(self.journal_path, "r") as f:
+                for line in f:
+                    self._journal_lines += 1
+                    record = json.loads(line)
+                    row = record["row"]
+                    if record["op"] == "put":
+                        old_row = self.rows.get(record["id"])
+                        if old_row is not None and old_row != row:
+                            self.ids[old_row] = None
+                            self.metadata[old_row] = None
+                        self.ids[row] = record["id"]
+                        self.metadata[row] = record["metadata"]
+                        self.rows[record["id"]] = row
+                    elif self.ids[row] == record["id"]:
+                        del self.rows[record["id"]]
+                        self.ids[row] = None
+                        self.metadata[row] = None
+
+        for row in self.rows.values():
+            self.live[row] = True
+        used = set(self.rows.values())
+        self.free_rows = [row for row in range(self.capacity - 1, -1, -1) if row not in used]
+        self.norms[:] = np.linalg.norm(self.matrix, axis=1) if self.capacity else 0
+
+        if self._journal_lines > 2 * len(self.rows) + 1000:
+            self.compact()
+
+    def _map(self):
+        """(Re)open the memory map at the current capacity."""
+        if self.capacity:
+            self.matrix = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dimension)
+            )
+        else:
+            self.matrix = None
+        norms = np.zeros(self.capacity, dtype=np.float32)
+        live = np.zeros(self.capacity, dtype=bool)
+        norms[:len(self.norms)] = self.norms[:self.capacity]
+        live[:len(self.live)] = self.live[:self.capacity]
+        self.norms = norms
+        self.live = live
+
+    def _grow(self, needed: int):
+        """Double capacity until `needed` more rows fit."""
+        new_capacity = max(self.capacity, 64)
+        while new_capacity - self.capacity + len(self.free_rows) < needed:
+            new_capacity *= 2
+        if new_capacity == self.capacity:
+            return
+        if self.matrix is not None:
+            self.matrix.flush()
+            self.matrix = None
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(new_capacity * self.dimension * 4)
+        self.free_rows = list(range(new_capacity - 1, self.capacity - 1, -1)) + self.free_rows
+        self.ids.extend([None] * (new_capacity - self.capacity))
+        self.metadata.extend([None] * (new_capacity - self.capacity))
+        self.capacity = new_capacity
+        self._map()
+
+    def _write_journal(self, records: List[Dict]):
+        if self._journal is None:
+            self._journal = open(self.journal_path, "a")
+        for record in records:
+            self._journal.write(json.dumps(record) + "\n")
+        self._journal.flush()
+        self._journal_lines += len(records)
+
+    def upsert(self, vectors: List[Vector]):
+        if not vectors:
+            return
+        # Reject the whole batch before touching any row or the journal
+        dimension = self.dimension or len(vectors[0].values)
+        for v in vectors:
+            if len(v.values) != dimension:
+                raise ValueError(f"Vector {v.id} has dimension {len(v.values)}, expected {dimension}")
+        if self.dimension is None:
+            self.dimension = dimension
+            self.header_path.write_text(json.dumps({"dimension": self.dimension, "name": self.name}))
+
+        new_ids = {v.id for v in vectors if v.id not in self.rows}
+        if new_ids:
+            self._sorted_ids = None
+        if len(new_ids) > len(self.free_rows):
+            self._grow(len(new_ids))
+
+        records = []
+        for v in vectors:
+            row = self.rows.get(v.id)
+            if row is None:
+                row = self.free_rows.pop()
+                self.rows[v.id] = row
+            values = np.asarray(v.values, dtype=np.float32)
+            self.matrix[row] = values
+            self.norms[row] = np.linalg.norm(values)
+            self.live[row] = True
+            self.ids[row] = v.id
+            self.metadata[row] = dict(v.metadata)
+            records.append({"op": "put", "id": v.id, "row": row, "metadata": self.metadata[row]})
+        self._write_journal(records)
+
+    def delete(self, ids: Iterable[str]):
+        records = []
+        for id in ids:
+            row = self.rows.pop(id, None)
+            if row is None:
+                continue
+            self.live[row] = False
+            self.ids[row] = None
+            self.metadata[row] = None
+            self.free_rows.append(row)
+            self._sorted_ids = None
+            records.append({"op": "del", "id": id, "row": row})
+        if records:
+            self._write_journal(records)
+
+    def update(self, id: str, values: Optional[List[float]], set_metadata: Optional[Dict]):
+        row = self.rows.get(id)
+        if row is None:
+            return
+        if values is not None:
+            if len(values) != self.dimension:
+                raise ValueError(f"Vector {id} has dimension {len(values)}, expected {self.dimension}")
+            self.matrix[row] = np.asarray(values, dtype=np.float32)
+            self.norms[row] = np.linalg.norm(self.matrix[row])
+        if set_metadata:
+            self.metadata[row].update(set_metadata)
+        self._write_journal([{"op": "put", "id": id, "row": row, "metadata": self.metadata[row]}])
+
+    def sorted_ids(self) -> List[str]:
+        """Live IDs in lexicographic order, cached until the ID set changes."""
+        if self._sorted_ids is None:
+            self._sorted_ids = sorted(self.rows)
+        return self._sorted_ids
+
+    def compact(self):
+        """Rewrite the journal so it holds one record per live vector."""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        tmp_path = self.journal_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            for id, row in self.rows.items():
+                f.write(json.dumps({"op": "put", "id": id, "row": row, "metadata": self.metadata[row]}) + "\n")
+        tmp_path.replace(self.journal_path)
+        self._journal_lines = len(self.rows)
+
+    def flush(self):
+        if self.matrix is not None:
+            self.matrix.flush()
+        if self._journal is not None:
+            self._journal.flush()
+
+    def close(self):
+        self.flush()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        self.matrix = None
+
+
+class NumpyVectorStore(VectorStore):
+    """In-process VectorStore keeping vectors in memory-mapped NumPy matrices.
+
+    Each namespace lives in its own directory under `path` with a float32
+    matrix file and an append-only JSON journal of metadata. Scores use
+    cosine similarity like the production index.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._namespaces: Dict[str, _NumpyNamespace] = {}
+
+        for directory in sorted(self.path.iterdir()):
+            if (directory / "namespace.json").exists():
+                name = json.loads((directory / "namespace.json").read_text()).get("name", directory.name)
+                self._namespaces[name] = _NumpyNamespace(directory, name)
+
+    def _namespace(self, namespace: str, create: bool = False) -> Optional[_NumpyNamespace]:
+        ns = self._namespaces.get(namespace)
+        if ns is None and create:
+            ns = _NumpyNamespace(self.path / (quote(namespace, safe="") or "__default__"), namespace)
+            self._namespaces[namespace] = ns
+        return ns
+
+    def query(self, vector, namespace="", top_k=10, include_values=False, include_metadata=False, filter=None, fields=None):
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns is None or not ns.rows:
+                return QueryResponse([], namespace)
+
+            mask = ns.live.copy()
+            if filter:
+                for row in np.flatnonzero(mask):
+                    if not matches_filter(ns.metadata[row], filter):
+                        mask[row] = False
+            candidates = np.flatnonzero(mask)
+            if not len(candidates):
+                return QueryResponse([], namespace)
+
+            query = np.asarray(vector, dtype=np.float32)
+            query_norm = np.linalg.norm(query) or 1.0
+            norms = ns.norms[candidates]
+            scores = (ns.matrix[candidates] @ query) / (np.where(norms > 0, norms, 1.0) * query_norm)
+
+            k = min(top_k, len(candidates))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            matches = []
+            for i in top:
+                row = candidates[i]
+                matches.append(Match(
+                    id=ns.ids[row],
+                    score=float(scores[i]),
+                    values=ns.matrix[row].tolist() if include_values else None,
+                    metadata=project_metadata(dict(ns.metadata[row]), fields) if include_metadata else None
+                ))
+            return QueryResponse(matches, namespace)
+
+    def upsert(self, vectors, namespace=""):
+        vectors = [to_vector(v) for v in vectors]
+        with self._lock:
+            self._namespace(namespace, create=True).upsert(vectors)
+        return {"upserted_count": len(vectors)}
+
+    def fetch(self, ids, namespace=""):
+        with self._lock:
+            ns = self._namespace(namespace)
+            vectors = {}
+            if ns is not None:
+                for id in ids:
+                    row = ns.rows.get(id)
+                    if row is not None:
+                        vectors[id] = Vector(id, ns.matrix[row].tolist(), dict(ns.metadata[row]))
+            return FetchResponse(vectors, namespace)
+
+    def delete(self, ids=None, deleteAll=False, filter=None, namespace=""):
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns is None:
+                return {}
+            if deleteAll:
+                ns.delete(list(ns.rows))
+                ns.compact()
+            elif filter:
+                ns.delete([id for id, row in ns.rows.items() if matches_filter(ns.metadata[row], filter)])
+            elif ids:
+                ns.delete(ids)
+        return {}
+
+    def update(self, id, values=None, set_metadata=None, namespace=""):
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns is not None:
+                ns.update(id, values, set_metadata)
+        return {}
+
+    def describe_index_stats(self):
+        with self._lock:
+            namespaces = {
+                name: {"vector_count": len(ns.rows)}
+                for name, ns in self._namespaces.items()
+                if ns.rows
+            }
+            dimensions = {ns.dimension for ns in self._namespaces.values() if ns.dimension}
+            return IndexStats(namespaces, dimension=dimensions.pop() if len(dimensions) == 1 else None)
+
+    def list_paginated(self, namespace="", limit=100, pagination_token=None, prefix=None):
+        with self._lock:
+            ns = self._namespace(namespace)
+            ids = ns.sorted_ids() if ns is not None else []
+        if prefix:
+            ids = [id for id in ids if id.startswith(prefix)]
+        start = bisect.bisect_right(ids, pagination_token) if pagination_token else 0
+        page = ids[start:start + limit]
+        has_more = start + limit < len(ids)
+        return ListResponse(page, page[-1] if has_more and page else None)
+
+    def location(self):
+        return {"backend": "numpy", "path": str(self.path.resolve())}
+
+    def flush(self):
+        """Flush memory maps and journals to disk."""
+        with self._lock:
+            for ns in self._namespaces.values():
+                ns.flush()
+
+    def close(self):
+        """Flush and release every namespace."""
+        with self._lock:
+            for ns in self._namespaces.values():
+                ns.close()